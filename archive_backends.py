@@ -0,0 +1,527 @@
+# archive_backends.py
+import os
+import time
+import zlib
+import queue
+import struct
+import threading
+import gzip
+import lzma
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from copy_engine import PART_SUFFIX
+from exclude_matcher import ExcludeMatcher
+
+CHUNK_SIZE = 1024 * 1024
+ZIP_LEVEL = 6  # zlib's default trade-off
+PARALLEL_MAX_SIZE = 16 * 1024 * 1024  # bigger files are streamed in order instead of buffered
+
+# Formats that are already compressed; deflating them again costs CPU for nothing
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".ico",
+    ".mp3", ".mp4", ".m4a", ".mkv", ".avi", ".mov", ".webm", ".ogg",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".jar", ".war", ".apk", ".whl", ".nupkg",
+    ".docx", ".xlsx", ".pptx", ".pdf", ".woff", ".woff2",
+}
+PROBE_SIZE = 64 * 1024
+PROBE_MIN_SIZE = 4096  # below this the probe costs more than it could save
+STORE_RATIO = 0.95  # store when a fast deflate of the first block saves less than 5%
+WALK_QUEUE_SIZE = 4096  # entries the walker may run ahead of the compressor
+
+
+def iter_zip_entries(top_level_folders, exclude_patterns=()):
+    # Yields (full_path, arcname, size) for every file to archive, in walk order.
+    # Excluded folders are pruned before os.walk descends into them.
+    matcher = ExcludeMatcher(exclude_patterns)
+    for folder_name, folder_path in top_level_folders:
+        excluded = matcher.for_root(folder_path) or (lambda path, is_dir=False: False)
+        for dirpath, dirnames, filenames in os.walk(folder_path):
+            dirnames[:] = [d for d in dirnames if not excluded(os.path.join(dirpath, d), True)]
+            for f in filenames:
+                full_path = os.path.join(dirpath, f)
+                if excluded(full_path):
+                    continue
+                rel_path = os.path.relpath(full_path, folder_path)
+                arcname = os.path.join(folder_name, rel_path)
+                try:
+                    size = os.path.getsize(full_path)
+                except OSError:
+                    size = 0
+                yield full_path, arcname, size
+
+
+def stream_entries(entries, tracker, estimate=None, maxsize=WALK_QUEUE_SIZE):
+    # Runs the entries generator on its own thread and yields from a bounded
+    # queue, so compression starts with the first file and memory stays flat.
+    # The tracker starts from the estimate and gets exact totals once the walk ends.
+    est_items, est_bytes = estimate or (0, 0)
+    tracker.set_totals(est_items, est_bytes)
+    pipe = queue.Queue(maxsize)
+    stop = threading.Event()
+    failure = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pipe.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def walk():
+        items = nbytes = 0
+        try:
+            for entry in entries:
+                if not put(entry):
+                    return
+                items += 1
+                nbytes += entry[2]
+                if items % 1000 == 0:
+                    tracker.set_totals(max(items, est_items), max(nbytes, est_bytes))
+            tracker.set_totals(items, nbytes)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            put(None)
+
+    threading.Thread(target=walk, daemon=True).start()
+    try:
+        while True:
+            entry = pipe.get()
+            if entry is None:
+                break
+            yield entry
+        if failure:
+            raise failure[0]
+    finally:
+        stop.set()
+
+
+def archive_name(top_level_folders, extension=".zip"):
+    # One folder is named after itself; siblings after their parent folder,
+    # otherwise after the names' common prefix
+    if len(top_level_folders) == 1:
+        name = top_level_folders[0][0]
+    else:
+        all_names = [name for (name, _) in top_level_folders]
+        name_prefix = os.path.commonprefix(all_names).rstrip("-_")
+
+        all_paths = [path for (_, path) in top_level_folders]
+        common_root = os.path.commonpath(all_paths)
+        parent_name = os.path.basename(common_root)
+
+        if len(set(os.path.dirname(p) for (_, p) in top_level_folders)) == 1:
+            name = parent_name or "smart-project"
+        elif name_prefix:
+            name = name_prefix
+        else:
+            name = "smart-project"
+    return name + extension
+
+
+def should_store(arcname, first_block):
+    if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+        return True
+    if len(first_block) < PROBE_MIN_SIZE:
+        return False
+    probe = first_block[:PROBE_SIZE]
+    return len(zlib.compress(probe, 1)) >= len(probe) * STORE_RATIO
+
+
+def compress_member(full_path, arcname, level, on_bytes):
+    # Deflate (or store) one file in memory; zlib releases the GIL, so several
+    # of these run truly in parallel. Returns the ZipInfo and the member data.
+    zinfo = zipfile.ZipInfo.from_file(full_path, arcname)
+    chunks = []
+    crc = 0
+    file_size = 0
+    with open(full_path, "rb") as src:
+        data = src.read(CHUNK_SIZE)
+        first_block = data
+        if should_store(arcname, data):
+            zinfo.compress_type = zipfile.ZIP_STORED
+            compressor = None
+        else:
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        while data:
+            crc = zlib.crc32(data, crc)
+            file_size += len(data)
+            chunks.append(compressor.compress(data) if compressor else data)
+            on_bytes(len(data))
+            data = src.read(CHUNK_SIZE)
+    if compressor:
+        chunks.append(compressor.flush())
+        # Small files skip the probe, and deflate can make them bigger. A file
+        # that fit in one block is still in memory, so store it as it is.
+        if file_size == len(first_block) and sum(len(chunk) for chunk in chunks) >= file_size:
+            zinfo.compress_type = zipfile.ZIP_STORED
+            chunks = [first_block] if file_size else []
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = sum(len(chunk) for chunk in chunks)
+    return zinfo, chunks
+
+
+def write_raw_member(zipf, zinfo, chunks):
+    # Splice an already compressed member into the archive. Mirrors what
+    # ZipFile._open_to_write and _ZipWriteFile.close do, minus the compressor.
+    zinfo.flag_bits = 0
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+    with zipf._lock:
+        if zipf._writing:
+            raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+        if zipf._seekable:
+            zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zipf.fp.write(zinfo.FileHeader())
+        for chunk in chunks:
+            zipf.fp.write(chunk)
+        zipf.start_dir = zipf.fp.tell()
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+
+
+def write_member(zipf, full_path, arcname, level, on_bytes):
+    # Same as zipf.write, but streamed in chunks so big files report progress
+    zinfo = zipfile.ZipInfo.from_file(full_path, arcname)
+    with open(full_path, "rb") as src:
+        data = src.read(CHUNK_SIZE)
+        if should_store(arcname, data):
+            zinfo.compress_type = zipfile.ZIP_STORED
+        else:
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            zinfo._compresslevel = level
+        with zipf.open(zinfo, "w") as dest:
+            while data:
+                dest.write(data)
+                on_bytes(len(data))
+                data = src.read(CHUNK_SIZE)
+    return zinfo
+
+
+def file_crc(full_path):
+    crc = 0
+    with open(full_path, "rb") as src:
+        while True:
+            data = src.read(CHUNK_SIZE)
+            if not data:
+                return crc
+            crc = zlib.crc32(data, crc)
+
+
+def iter_raw_member(archive_path, old_info):
+    # The member's compressed bytes exactly as stored in an existing archive
+    with open(archive_path, "rb") as src:
+        src.seek(old_info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, src.read(zipfile.sizeFileHeader))
+        if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local header for {old_info.filename}")
+        src.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+        remaining = old_info.compress_size
+        while remaining:
+            data = src.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                raise zipfile.BadZipFile(f"Truncated member {old_info.filename}")
+            remaining -= len(data)
+            yield data
+
+
+def reuse_member(archive_path, old_infos, full_path, arcname):
+    # Returns (zinfo, raw chunks) taken from the previous archive when the file
+    # is unchanged there (same size, timestamp and CRC), otherwise None
+    zinfo = zipfile.ZipInfo.from_file(full_path, arcname)
+    old_info = old_infos.get(zinfo.filename)
+    # Zip timestamps only keep even seconds
+    date_time = zinfo.date_time[:5] + (zinfo.date_time[5] // 2 * 2,)
+    if (old_info is None or old_info.flag_bits & 0x1
+            or old_info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+            or old_info.file_size != zinfo.file_size or old_info.date_time != date_time):
+        return None
+    # Checksumming runs at disk speed, far cheaper than compressing again
+    if file_crc(full_path) != old_info.CRC:
+        return None
+    zinfo.compress_type = old_info.compress_type
+    zinfo.CRC = old_info.CRC
+    zinfo.compress_size = old_info.compress_size
+    return zinfo, iter_raw_member(archive_path, old_info)
+
+
+class CompressionStats:
+    # Per-extension totals for the completion report
+    def __init__(self):
+        self.by_ext = {}
+
+    def record(self, zinfo, seconds, reused=False):
+        ext = os.path.splitext(zinfo.filename)[1].lower() or "(no ext)"
+        entry = self.by_ext.setdefault(ext, {"files": 0, "size": 0, "packed": 0, "seconds": 0.0, "stored": 0,
+                                             "reused": 0})
+        entry["files"] += 1
+        entry["size"] += zinfo.file_size
+        entry["packed"] += zinfo.compress_size
+        entry["seconds"] += seconds
+        if zinfo.compress_type == zipfile.ZIP_STORED:
+            entry["stored"] += 1
+        if reused:
+            entry["reused"] += 1
+
+    def report(self, limit=8):
+        rows = sorted(self.by_ext.items(), key=lambda item: item[1]["size"], reverse=True)
+        lines = []
+        for ext, entry in rows[:limit]:
+            ratio = entry["packed"] / entry["size"] if entry["size"] else 1.0
+            stored = f", {entry['stored']} stored" if entry["stored"] else ""
+            reused = f", {entry['reused']} reused" if entry["reused"] else ""
+            lines.append(f"{ext}: {entry['files']} files, {entry['size'] / (1024 * 1024):.1f} MB → "
+                         f"{ratio:.0%} in {entry['seconds']:.1f}s{stored}{reused}")
+        if len(rows) > limit:
+            lines.append(f"... and {len(rows) - limit} more types")
+        return "\n".join(lines)
+
+
+class ZipBackend:
+    # Every backend takes (full_path, arcname, size) entries and reports
+    # progress through a ProgressTracker; write() returns a summary for the user.
+    name = "zip"
+    extension = ".zip"
+    levels = range(0, 10)
+
+    def __init__(self, level=ZIP_LEVEL, workers=1, incremental=False):
+        self.level = level
+        self.workers = max(1, workers)
+        self.incremental = incremental
+        self.stats = CompressionStats()
+
+    def write(self, archive_path, entries, tracker):
+        # Incremental mode builds the new archive next to the old one, copying
+        # unchanged members across still compressed, then swaps it in
+        old_infos = {}
+        if self.incremental and os.path.exists(archive_path):
+            try:
+                with zipfile.ZipFile(archive_path) as old:
+                    old_infos = dict(old.NameToInfo)
+            except (OSError, zipfile.BadZipFile) as e:
+                print(f"Not reusing {archive_path}: {e}")
+        if not old_infos:
+            return self.write_members(archive_path, entries, tracker, old_infos, archive_path)
+
+        target = archive_path + PART_SUFFIX
+        try:
+            report = self.write_members(target, entries, tracker, old_infos, archive_path)
+        except BaseException:
+            if os.path.exists(target):
+                os.remove(target)
+            raise
+        os.replace(target, archive_path)
+        return report
+
+    def write_members(self, target, entries, tracker, old_infos, old_path):
+        level, workers, stats = self.level, self.workers, self.stats
+
+        def reuse(full_path, arcname, size):
+            if not old_infos:
+                return None
+            member = reuse_member(old_path, old_infos, full_path, arcname)
+            if member is not None:
+                tracker.add_bytes(size)
+            return member
+
+        # Members are compressed on a thread pool and spliced into the archive
+        # in their original order; a bounded window keeps memory flat
+        def compress(full_path, arcname, size):
+            read = 0
+
+            def count(n):
+                nonlocal read
+                read += n
+                tracker.add_bytes(n)
+
+            started = time.perf_counter()
+            try:
+                member = reuse(full_path, arcname, size)
+                if member is not None:
+                    return member, time.perf_counter() - started, size, True, None
+                member = compress_member(full_path, arcname, level, count)
+                return member, time.perf_counter() - started, read, False, None
+            except Exception as e:
+                return None, 0.0, read, False, e
+
+        pending = deque()
+
+        def splice(window):
+            while len(pending) > window:
+                full_path, arcname, size, future = pending.popleft()
+                member, seconds, read, reused, error = future.result()
+                tracker.start_item(arcname)
+                if error is None:
+                    try:
+                        write_raw_member(zipf, *member)
+                        stats.record(member[0], seconds, reused)
+                    except Exception as e:
+                        error = e
+                log_line = None
+                if error is not None:
+                    print(f"Skipping {full_path} due to {error}")
+                    log_line = f"[ERROR] {full_path} -> {error}"
+                # Keep the byte count in step with the totals even if the file changed
+                tracker.item_done(arcname, size - read, error=error, log_line=log_line)
+
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED, compresslevel=level) as zipf, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zip") as pool:
+            for full_path, arcname, size in entries:
+                if size <= PARALLEL_MAX_SIZE:
+                    pending.append((full_path, arcname, size, pool.submit(compress, full_path, arcname, size)))
+                    splice(workers * 2)
+                    continue
+
+                splice(0)  # everything before it goes in first
+                tracker.start_item(arcname)
+                written = 0
+
+                def count(n):
+                    nonlocal written
+                    written += n
+                    tracker.add_bytes(n)
+
+                started = time.perf_counter()
+                error = log_line = None
+                try:
+                    member = reuse(full_path, arcname, size)
+                    if member is not None:
+                        written = size
+                        write_raw_member(zipf, *member)
+                        stats.record(member[0], time.perf_counter() - started, True)
+                    else:
+                        zinfo = write_member(zipf, full_path, arcname, level, count)
+                        stats.record(zinfo, time.perf_counter() - started)
+                except Exception as e:
+                    print(f"Skipping {full_path} due to {e}")
+                    error, log_line = e, f"[ERROR] {full_path} -> {e}"
+                tracker.item_done(arcname, size - written, error=error, log_line=log_line)
+            splice(0)
+
+        print(stats.report(limit=len(stats.by_ext)))
+        return stats.report()
+
+
+class _CountingReader:
+    def __init__(self, fileobj, on_bytes):
+        self.fileobj = fileobj
+        self.on_bytes = on_bytes
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.on_bytes(len(data))
+        return data
+
+
+class TarBackend:
+    # A tar stream piped straight through a compressor into the target file,
+    # so nothing is staged on disk. Subclasses only provide open_stream().
+    name = "tar"
+    extension = ".tar"
+    levels = range(0, 10)  # gzip and xz presets
+
+    def __init__(self, level=ZIP_LEVEL, workers=1, incremental=False):
+        # A compressed tar stream can't be patched, so incremental is ignored
+        self.level = level
+        self.workers = max(1, workers)
+
+    def open_stream(self, raw):
+        return raw
+
+    def write(self, archive_path, entries, tracker):
+        started = time.perf_counter()
+        files = total = 0
+        with open(archive_path, "wb") as raw:
+            stream = self.open_stream(raw)
+            try:
+                with tarfile.open(fileobj=stream, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                    for full_path, arcname, size in entries:
+                        tracker.start_item(arcname)
+                        read = 0
+
+                        def count(n):
+                            nonlocal read
+                            read += n
+                            tracker.add_bytes(n)
+
+                        try:
+                            src = open(full_path, "rb")
+                        except OSError as e:
+                            print(f"Skipping {full_path} due to {e}")
+                            tracker.item_done(arcname, size, error=e, log_line=f"[ERROR] {full_path} -> {e}")
+                            continue
+                        with src:
+                            # A file that shrinks mid-read would leave a broken
+                            # stream, so that error is fatal rather than skipped
+                            tarinfo = tar.gettarinfo(arcname=arcname, fileobj=src)
+                            tar.addfile(tarinfo, _CountingReader(src, count))
+                        files += 1
+                        total += tarinfo.size
+                        tracker.item_done(arcname, size - read)
+            finally:
+                if stream is not raw:
+                    stream.close()
+            packed = raw.tell()
+
+        ratio = packed / total if total else 1.0
+        return (f"{self.name}: {files} files, {total / (1024 * 1024):.1f} MB → "
+                f"{ratio:.0%} in {time.perf_counter() - started:.1f}s")
+
+
+class TarGzBackend(TarBackend):
+    name = "tar.gz"
+    extension = ".tar.gz"
+
+    def open_stream(self, raw):
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=self.level)
+
+
+class TarXzBackend(TarBackend):
+    name = "tar.xz"
+    extension = ".tar.xz"
+
+    def open_stream(self, raw):
+        return lzma.LZMAFile(raw, "wb", preset=self.level)
+
+
+class TarZstBackend(TarBackend):
+    # zstd spreads one stream over several threads, unlike gzip and xz here
+    name = "tar.zst"
+    extension = ".tar.zst"
+    levels = range(1, 23)
+
+    def open_stream(self, raw):
+        compressor = zstandard.ZstdCompressor(level=self.level, threads=self.workers)
+        return compressor.stream_writer(raw, closefd=False)
+
+
+ARCHIVE_BACKENDS = {backend.name: backend for backend in (ZipBackend, TarGzBackend, TarXzBackend, TarZstBackend)}
+
+
+def available_formats():
+    return [name for name in ARCHIVE_BACKENDS if name != "tar.zst" or zstandard is not None]
+
+
+def make_backend(name, level=ZIP_LEVEL, workers=1, incremental=False):
+    if name not in available_formats():
+        raise ValueError(f"Archive format not available: {name}")
+    backend = ARCHIVE_BACKENDS[name]
+    # An out of range level would only surface as a failure on every member
+    if level not in backend.levels:
+        raise ValueError(f"{name} compression level must be {backend.levels[0]}-{backend.levels[-1]}, not {level}")
+    return backend(level, workers, incremental)
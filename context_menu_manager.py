@@ -14,6 +14,7 @@ class ContextMenuManager:
         self.context_menu_item.add_command(label="❌ Remove from List", command=self.remove_from_list)
 
         self.context_menu_empty = tk.Menu(self.app, tearoff=0)
+        self.context_menu_empty.add_command(label="🔄 Full Rescan", command=self.full_rescan)
         self.context_menu_empty.add_command(label="🗑️ Clear All", command=self.clear_all_folders)
 
     def show_menu(self, event):
@@ -53,7 +54,12 @@ class ContextMenuManager:
                 if folder_path and folder_path in self.app.source_dirs:
                     self.app.source_dirs.remove(folder_path)
                 self.app.tree.delete(node)
-                self.app.tree_nodes.pop(node, None)
+                for n in self.app.scan_index.iter_subtree(int(node)):
+                    self.app.tree_nodes.pop(str(n), None)
+                self.app.selection.forget(int(node))
+                if int(node) in self.app.scan_index.roots:
+                    self.app.scan_index.roots.remove(int(node))
+                self.app.update_total_selected_size()
                 self.app.source_entry.delete(0, tk.END)
                 self.app.source_entry.insert(0, "; ".join(self.app.source_dirs))
                 self.app.status_label.config(text=f"Removed folder: {os.path.basename(folder_path)}")
@@ -62,6 +68,12 @@ class ContextMenuManager:
         else:
             messagebox.showinfo("Remove Folder", "Please select a folder node to remove.")
 
+    def full_rescan(self):
+        if not getattr(self.app, "source_dirs", None):
+            messagebox.showinfo("Nothing to Scan", "There are no folders to rescan.")
+            return
+        self.app.start_loading_tree_multi(use_cache=False)
+
     def clear_all_folders(self):
         if not self.app.source_dirs:
             messagebox.showinfo("Nothing to Clear", "There are no folders to clear.")
@@ -69,9 +81,7 @@ class ContextMenuManager:
 
         if messagebox.askyesno("Clear All", "Are you sure you want to clear all folders?"):
             self.app.source_dirs.clear()
-            self.app.tree.delete(*self.app.tree.get_children())
-            self.app.tree_nodes.clear()
-            self.app.checked_items.clear()
-            self.app.partial_checked_items.clear()
+            self.app.restore_paths = None
+            self.app.reset_tree()
             self.app.source_entry.delete(0, tk.END)
             self.app.status_label.config(text="All folders cleared.")
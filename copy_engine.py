@@ -0,0 +1,255 @@
+# copy_engine.py
+import os
+import sys
+import errno
+import shutil
+import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+COPY_WORKERS = 4
+CHUNK_SIZE = 8 * 1024 * 1024
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+MTIME_TOLERANCE = 2.0  # FAT/exFAT destinations only keep mtimes to 2 seconds
+PART_SUFFIX = ".part"  # files are copied under this name and renamed when complete
+
+# Errors meaning "this kernel/filesystem can't do that", not "the copy failed"
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF,
+                      errno.ETXTBSY, errno.EPERM}
+
+
+class CopyCancelled(Exception):
+    pass
+
+
+def _clone(src_fd, dst_fd):
+    # Reflink: the destination shares the source's blocks (btrfs, XFS, ...)
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+def _kernel_copy(copy_chunk, src_fd, dst_fd, on_bytes):
+    # Runs copy_chunk until EOF. Returns False when the very first call reports
+    # the method as unsupported, so the caller can try the next one.
+    copied = 0
+    while True:
+        try:
+            n = copy_chunk(src_fd, dst_fd)
+        except OSError as e:
+            if copied == 0 and e.errno in UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if n == 0:
+            return True
+        copied += n
+        on_bytes(n)
+
+
+def _read_write(src_fd, dst_fd, on_bytes):
+    while True:
+        data = os.read(src_fd, CHUNK_SIZE)
+        if not data:
+            return
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        on_bytes(len(data))
+
+
+def file_digest(path):
+    h = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                return h.digest()
+            h.update(data)
+
+
+def is_unchanged(src_path, dst_path, verify_hash=False):
+    # The source is stat'ed again here: the scan index may come from the scan
+    # cache, and a stale size must never make us skip a changed file.
+    try:
+        src, dst = os.stat(src_path), os.stat(dst_path)
+    except OSError:
+        return False
+    if src.st_size != dst.st_size or abs(src.st_mtime - dst.st_mtime) > MTIME_TOLERANCE:
+        return False
+    return not verify_hash or file_digest(src_path) == file_digest(dst_path)
+
+
+def copy_file(src_path, dst_path, on_bytes=None):
+    # Same result as shutil.copy2, but on Linux the data never passes through
+    # user space when the kernel can help. Returns the strategy that was used.
+    # on_bytes(n) is called as data lands, at most CHUNK_SIZE at a time.
+    on_bytes = on_bytes or (lambda n: None)
+    linux = sys.platform.startswith("linux")
+    if not linux and os.path.getsize(src_path) <= CHUNK_SIZE:
+        shutil.copy2(src_path, dst_path)
+        on_bytes(os.path.getsize(dst_path))
+        return "copy2"
+
+    with open(src_path, "rb") as fsrc, open(dst_path, "wb") as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        if linux and _clone(src_fd, dst_fd):
+            on_bytes(os.fstat(src_fd).st_size)
+            strategy = "reflink"
+        elif linux and hasattr(os, "copy_file_range") and _kernel_copy(
+                lambda s, d: os.copy_file_range(s, d, CHUNK_SIZE), src_fd, dst_fd, on_bytes):
+            strategy = "copy_file_range"
+        elif linux and hasattr(os, "sendfile") and _kernel_copy(
+                lambda s, d: os.sendfile(d, s, None, CHUNK_SIZE), src_fd, dst_fd, on_bytes):
+            strategy = "sendfile"
+        else:
+            # Also used for big files elsewhere, so they report progress chunk by chunk
+            _read_write(src_fd, dst_fd, on_bytes)
+            strategy = "read/write"
+    shutil.copystat(src_path, dst_path)
+    return strategy
+
+
+class CopyEngine:
+    # Copies a batch of files on a pool of worker threads. Small-file copies are
+    # latency bound, so several in flight keep the disk busy.
+    def __init__(self, workers=COPY_WORKERS, sync=False, verify_hash=False, journal=None, resume=False):
+        # sync: skip files whose destination already has the same size and mtime
+        # (and the same content too when verify_hash is set).
+        # journal: a CopyJournal that records finished files as they complete;
+        # with resume, files it already lists are not copied again.
+        self.workers = max(1, int(workers))
+        self.sync = sync
+        self.verify_hash = verify_hash
+        self.journal = journal
+        self.resume = resume
+        self.finished = {}
+        self.errors = 0
+        self.strategies = Counter()
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.pool = None
+
+    def run(self, jobs, dirs=(), on_done=None, on_bytes=None):
+        # jobs are (src_path, dst_path, size, label) tuples; on_done(job, error, skipped)
+        # is called from a worker thread after each file, error being None on success.
+        # on_bytes(n) reports progress while files copy; by the time a job is
+        # done exactly its size has been reported, whether copied, skipped or failed.
+        self.make_dirs(list(dirs) + [os.path.dirname(job[1]) for job in jobs])
+        if self.journal is not None:
+            self.finished = self.journal.load() if self.resume else {}
+            self.journal.open(append=self.resume)
+
+        # Biggest files first, so one large file doesn't end up as a single-threaded tail
+        jobs = sorted(jobs, key=lambda job: job[2], reverse=True)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="copy") as pool:
+                self.pool = pool
+                for job in jobs:
+                    if self.cancelled.is_set():
+                        break
+                    try:
+                        pool.submit(self.copy_job, job, on_done, on_bytes)
+                    except RuntimeError:
+                        # cancel() shut the pool down between the check and the submit
+                        if not self.cancelled.is_set():
+                            raise
+                        break
+        finally:
+            self.pool = None
+            if self.journal is not None:
+                self.journal.close(completed=self.errors == 0 and not self.cancelled.is_set())
+
+    def cancel(self):
+        # Safe from any thread: queued files are dropped, files in flight stop at
+        # their next chunk and lose their .part file, and the journal is kept for Resume
+        self.cancelled.set()
+        pool = self.pool
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def make_dirs(self, dirs):
+        # Each destination folder is created once, parents before children
+        for path in sorted(set(dirs)):
+            try:
+                os.makedirs(path, exist_ok=True)
+            except OSError as e:
+                print(f"Could not create {path}: {e}")
+
+    def copy_job(self, job, on_done, on_bytes=None):
+        src_path, dst_path, size, label = job
+        reported = 0
+
+        def count_bytes(n):
+            nonlocal reported
+            if self.cancelled.is_set():
+                raise CopyCancelled()
+            reported += n
+            if on_bytes is not None:
+                on_bytes(n)
+
+        if self.cancelled.is_set():
+            return
+        skipped = False
+        try:
+            if self.resume and self.already_copied(src_path, dst_path):
+                skipped = True
+                strategy = "resumed"
+            elif self.sync and is_unchanged(src_path, dst_path, self.verify_hash):
+                skipped = True
+                strategy = "unchanged"
+            else:
+                # Copy under a temporary name, so an interrupted copy never
+                # leaves a truncated file that looks finished
+                part_path = dst_path + PART_SUFFIX
+                try:
+                    strategy = copy_file(src_path, part_path, count_bytes)
+                    os.replace(part_path, dst_path)
+                except Exception:
+                    try:
+                        os.remove(part_path)
+                    except OSError:
+                        pass
+                    raise
+                if self.journal is not None:
+                    st = os.stat(src_path)
+                    self.journal.record(src_path, dst_path, st.st_size, st.st_mtime)
+        except CopyCancelled:
+            return
+        except Exception as e:
+            error = e
+            with self.lock:
+                self.errors += 1
+        else:
+            error = None
+            with self.lock:
+                self.strategies[strategy] += 1
+        # Settle up with the size the totals were computed from
+        if on_bytes is not None and reported != size:
+            on_bytes(size - reported)
+        if on_done is not None:
+            on_done(job, error, skipped)
+
+    def already_copied(self, src_path, dst_path):
+        # Journaled, the source hasn't changed since, and the copy is all there
+        entry = self.finished.get(dst_path)
+        if entry is None:
+            return False
+        try:
+            src, dst = os.stat(src_path), os.stat(dst_path)
+        except OSError:
+            return False
+        return entry == (src.st_size, src.st_mtime) and dst.st_size == src.st_size
+
+    def strategy_summary(self):
+        # e.g. "copy_file_range × 1200, reflink × 3"
+        return ", ".join(f"{name} × {count}" for name, count in self.strategies.most_common()) or "nothing copied"
@@ -0,0 +1,54 @@
+# copy_journal.py
+import os
+import json
+import threading
+
+JOURNAL_NAME = ".smart_copy_journal"
+
+
+class CopyJournal:
+    # Append-only list of files that finished copying into dest_root, one JSON
+    # object per line, flushed as the copy runs so a crash loses at most the
+    # files that were in flight.
+    def __init__(self, dest_root):
+        self.path = os.path.join(dest_root, JOURNAL_NAME)
+        self.lock = threading.Lock()
+        self.file = None
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def load(self):
+        # dst_path -> (source size, source mtime) for every journaled file
+        done = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    done[entry["dst"]] = (entry["size"], entry["mtime"])
+        except OSError:
+            pass
+        return done
+
+    def open(self, append=False):
+        self.file = open(self.path, "a" if append else "w", encoding="utf-8")
+
+    def record(self, src_path, dst_path, size, mtime):
+        line = json.dumps({"src": src_path, "dst": dst_path, "size": size, "mtime": mtime})
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self, completed):
+        # A clean run needs no journal; otherwise keep it for the next Resume
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if completed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -1,22 +1,32 @@
 import os
 import json
+import threading
 from collections import defaultdict
 
+LOG_DIR = r"Output"  # Default root directory for logs
+
 class CopyLogger:
-    def __init__(self, root_dir):
-        self.root_dir = root_dir  # Use the provided root_dir
-        self.root_dir = r"Output"  # Default root directory for logs
+    def __init__(self, root_dir=LOG_DIR):
+        self.root_dir = root_dir
         self.tree = lambda: defaultdict(self.tree)
         self.json_log = self.tree()  # This will store the structured JSON log
         self.txt_log = []
+        self.lock = threading.Lock()  # the copy engine logs from several threads
 
     def log_success(self, rel_path):
-        self._insert_to_json(rel_path, "OK")
-        self.txt_log.append(f"[OK] {rel_path}")
+        with self.lock:
+            self._insert_to_json(rel_path, "OK")
+            self.txt_log.append(f"[OK] {rel_path}")
+
+    def log_skipped(self, rel_path):
+        with self.lock:
+            self._insert_to_json(rel_path, "SKIPPED")
+            self.txt_log.append(f"[SKIPPED] {rel_path}")
 
     def log_error(self, rel_path, error):
-        self._insert_to_json(rel_path, f"ERROR: {error}")
-        self.txt_log.append(f"[ERROR] {rel_path} -> {error}")
+        with self.lock:
+            self._insert_to_json(rel_path, f"ERROR: {error}")
+            self.txt_log.append(f"[ERROR] {rel_path} -> {error}")
 
     def _insert_to_json(self, rel_path, status):
         parts = rel_path.split(os.sep)
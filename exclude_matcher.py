@@ -0,0 +1,104 @@
+# exclude_matcher.py
+import os
+import re
+
+# gitignore-style exclude patterns, compiled once and matched against paths
+# relative to a source folder:
+#   node_modules   any file or folder with that name, at any depth
+#   *.log          glob on the name (*, ?, [abc]); ** spans folders
+#   /dist          anchored to the source folder (so is any pattern with a /)
+#   build/         folders only
+#   !keep.log      re-include something an earlier pattern excluded
+# Callers walk top-down and prune excluded folders, so a name pattern only
+# ever has to look at the last path component.
+
+
+def glob_to_regex(pattern):
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern.startswith("[!", i) else i + 1)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def compile_pattern(pattern):
+    # Returns (regex source, negated) or None for blanks and comments
+    pattern = pattern.strip().replace("\\", "/")
+    if not pattern or pattern.startswith("#"):
+        return None
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    if not pattern:
+        return None
+    prefix = "^" if anchored else "(?:^|/)"
+    # Folders are matched with a trailing slash, which dir-only patterns require
+    suffix = "/$" if dir_only else "/?$"
+    return prefix + glob_to_regex(pattern) + suffix, negated
+
+
+class ExcludeMatcher:
+    def __init__(self, patterns=()):
+        self.patterns = list(patterns)
+        compiled = [c for c in map(compile_pattern, self.patterns) if c is not None]
+        self.rules = [(re.compile(source), negated) for source, negated in compiled]
+        self.has_negation = any(negated for _, negated in compiled)
+        # One alternation answers "does anything match"; only when negations
+        # exist does the last matching rule have to be looked up
+        self.any_rule = re.compile("|".join(f"(?:{source})" for source, _ in compiled)) if compiled else None
+
+    def __bool__(self):
+        return self.any_rule is not None
+
+    def match(self, rel_path, is_dir=False):
+        if self.any_rule is None or not rel_path:
+            return False
+        if os.sep != "/":
+            rel_path = rel_path.replace(os.sep, "/")
+        if is_dir:
+            rel_path += "/"
+        if not self.any_rule.search(rel_path):
+            return False
+        if not self.has_negation:
+            return True
+        for rule, negated in reversed(self.rules):
+            if rule.search(rel_path):
+                return not negated
+        return False
+
+    def for_root(self, root_path):
+        # excluded(path, is_dir) for full paths under root_path, or None when
+        # there is nothing to exclude
+        if self.any_rule is None:
+            return None
+        prefix_len = len(root_path.rstrip("/\\")) + 1
+        return lambda path, is_dir=False: self.match(path[prefix_len:], is_dir)
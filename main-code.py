@@ -1,6 +1,6 @@
 import os
-import shutil
 import time
+import queue
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
@@ -12,6 +12,19 @@ from tkinterdnd2 import DND_FILES, TkinterDnD
 from copy_logger import CopyLogger
 from context_menu_manager import ContextMenuManager
 from zip_manager import ZipManager
+from archive_backends import ARCHIVE_BACKENDS, ZIP_LEVEL, available_formats, archive_name
+from scanner import ScanIndex, scan_into_queue, merge_batch
+from copy_engine import CopyEngine, COPY_WORKERS
+from copy_journal import CopyJournal
+from progress import ProgressTracker, poll_progress, format_eta
+from selection import SelectionModel, copy_plan, iter_archive_entries
+from project_mapper import PROJECT_EXCLUDES, DEFAULT_EXCLUDES, detect_project_types, project_excludes, merge_excludes
+from exclude_matcher import ExcludeMatcher
+from search_index import SearchIndex, SEARCH_DEBOUNCE_MS, SEARCH_MAX_RESULTS
+from search_query import SearchQuery
+
+SCAN_POLL_MS = 50  # how often the UI drains scan results
+SCAN_TIME_BUDGET = 0.03  # seconds of merging per tick before yielding to Tk
 
 class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
     def __init__(self):
@@ -30,6 +43,15 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         self.source_dir = ""
         self.dest_dir = "D:/Test Folder"
         self.tree_nodes = {}
+        self.scan_index = ScanIndex()
+        self.search_index = SearchIndex(self.scan_index)
+        self.search_job = None
+        self.search_highlighted = []
+        self.search_opened = set()
+        self.search_matches = []
+        self.search_query = None
+        self.scan_queue = None
+        self.scan_cancel = threading.Event()
         self.checkbox_images = self.create_checkbox_images()
 
         self.style = ttk.Style()
@@ -44,11 +66,11 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         self.style.configure("TEntry", font=("Segoe UI", 10), padding=5)
         self.style.configure("TProgressbar", thickness=20)
 
-        self.checked_items = set()
-        self.partial_checked_items = set()
+        self.selection = SelectionModel(self.scan_index)
+        self.restore_paths = None  # selection to re-apply once a full reload finishes
 
         self.create_widgets()
-        self.exclude_patterns = ["node_modules"]  # default
+        self.exclude_patterns = list(DEFAULT_EXCLUDES)
 
         # context menu manager
         self.context_menu_manager = ContextMenuManager(self)
@@ -64,6 +86,12 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         self.source_dirs = list(paths)
         self.source_entry.delete(0, tk.END)
         self.source_entry.insert(0, "; ".join(paths))
+
+        # 🔍 Detect and auto-select project types
+        detected = self.detect_project_types(self.source_dirs)
+        for proj_type, var in self.project_types.items():
+            var.set(proj_type in detected)
+
         self.start_loading_tree_multi()
 
     def toggle_selected_checkbox(self, event=None):
@@ -123,6 +151,9 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         self.search_entry = ttk.Entry(search_frame, width=50)
         self.search_entry.pack(side="left", padx=5)
         self.search_entry.bind("<KeyRelease>", self.filter_files)
+        ttk.Button(search_frame, text="☑ Check Matches", command=self.check_all_matches).pack(side="left", padx=(0, 5))
+
+        self.chechbox_project_type_dropdown()
 
         ttk.Button(search_frame, text="Exclude...", command=self.open_exclude_popup).pack(side="left", padx=(5, 0))
 
@@ -165,6 +196,7 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
 
         self.tree.tag_configure("evenrow", background="#f9f9f9")
         self.tree.tag_configure("oddrow", background="#ffffff")
+        self.tree.tag_configure("highlight", background="#ffffcc", font=("Segoe UI", 10, "bold"))
 
         bottom_frame = ttk.Frame(self)
         bottom_frame.pack(fill="x", padx=15, pady=(5, 15))
@@ -176,14 +208,38 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         self.status_label = ttk.Label(bottom_frame, text="Ready")
         self.status_label.pack(side="left", padx=5)
 
+        self.cancel_scan_btn = ttk.Button(bottom_frame, text="✖ Cancel", command=self.cancel_scan)
+
         self.total_size_label = ttk.Label(bottom_frame, text="Total Size: 0 MB")
         self.total_size_label.pack(side="left", padx=10)
 
         self.start_btn = ttk.Button(bottom_frame, text="🚀 Start Copy", command=self.start_copy)
         self.start_btn.pack(side="right")
+        self.resume_btn = ttk.Button(bottom_frame, text="⏯ Resume Copy", command=lambda: self.start_copy(resume=True))
+        self.resume_btn.pack(side="right", padx=(0, 5))
+
+        self.copy_workers = tk.IntVar(value=COPY_WORKERS)
+        ttk.Spinbox(bottom_frame, from_=1, to=32, width=3, textvariable=self.copy_workers).pack(side="right")
+        ttk.Label(bottom_frame, text="Threads:").pack(side="right", padx=(10, 2))
+
+        self.zip_level = tk.IntVar(value=ZIP_LEVEL)
+        self.level_spinbox = ttk.Spinbox(bottom_frame, from_=0, to=9, width=2, textvariable=self.zip_level)
+        self.level_spinbox.pack(side="right")
+        ttk.Label(bottom_frame, text="Level:").pack(side="right", padx=(10, 2))
+
+        self.archive_format = tk.StringVar(value="zip")
+        format_box = ttk.Combobox(bottom_frame, textvariable=self.archive_format, values=available_formats(),
+                                  state="readonly", width=7)
+        format_box.pack(side="right")
+        format_box.bind("<<ComboboxSelected>>", self.on_format_change)
 
         self.zip_mode = tk.BooleanVar(value=False)
-        ttk.Checkbutton(bottom_frame, text="Zip instead of Copy", variable=self.zip_mode).pack(side="right", padx=10)
+        ttk.Checkbutton(bottom_frame, text="Zip instead of Copy", variable=self.zip_mode).pack(side="right", padx=(10, 2))
+
+        self.sync_verify = tk.BooleanVar(value=False)
+        ttk.Checkbutton(bottom_frame, text="Verify by hash", variable=self.sync_verify).pack(side="right")
+        self.sync_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(bottom_frame, text="Only changed files", variable=self.sync_mode).pack(side="right", padx=(10, 5))
         
         path_frame.columnconfigure(1, weight=1)
         tree_container.columnconfigure(0, weight=1)
@@ -208,6 +264,9 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         if self.source_dirs:
             self.source_entry.delete(0, tk.END)
             self.source_entry.insert(0, "; ".join(self.source_dirs))
+            detected = self.detect_project_types(self.source_dirs)
+            for proj_type, var in self.project_types.items():
+                var.set(proj_type in detected)
             self.start_loading_tree_multi()
 
     def add_folder(self):
@@ -215,12 +274,19 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         if folder:
             if not hasattr(self, 'source_dirs'):
                 self.source_dirs = []
-            if folder not in self.source_dirs:
-                self.source_dirs.append(folder)
+            if folder in self.source_dirs:
+                return
+            self.source_dirs.append(folder)
             # Update source entry text to show all selected folders separated by '; '
             self.source_entry.delete(0, tk.END)
             self.source_entry.insert(0, "; ".join(self.source_dirs))
-            self.start_loading_tree_multi()
+
+            # A newly detected project type changes what the other folders exclude too
+            new_types = [proj_type for proj_type in self.detect_project_types([folder])
+                         if not self.project_types[proj_type].get()]
+            for proj_type in new_types:
+                self.project_types[proj_type].set(True)
+            self.start_loading_tree_multi(None if new_types else [folder])
 
 
     def start_loading_tree(self):
@@ -230,72 +296,141 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         self.start_btn.config(state="disabled")
         threading.Thread(target=self.build_tree, daemon=True).start()
 
-    def start_loading_tree_multi(self):
+    def start_loading_tree_multi(self, new_roots=None, use_cache=True):
+        # new_roots=None reloads every source folder; otherwise only the given
+        # folders are scanned and merged into the existing index. Unchanged
+        # folders are read from the scan cache unless use_cache is False.
+        if self.scan_queue is not None:
+            new_roots = None  # a scan is still running, redo everything
+
+        if new_roots is None:
+            # A reload replaces every node id; keep the checkboxes by path. If an
+            # earlier reload hasn't finished, its saved selection still applies.
+            if self.restore_paths is None:
+                self.restore_paths = self.selection.picked_paths()
+            self.reset_tree()
+            new_roots = self.source_dirs
+
         self.progress.config(mode="indeterminate")
         self.progress.start()
         self.status_label.config(text="⏳ Loading files...")
         self.start_btn.config(state="disabled")
-        threading.Thread(target=self.build_tree_multi, daemon=True).start()
+        self.cancel_scan_btn.pack(side="left", padx=5, after=self.status_label)
+
+        self.scan_cancel = threading.Event()
+        self.scan_queue = queue.Queue()
+        self.scan_start = len(self.scan_index)
+        self.scan_streams = {}
+
+        scan_into_queue(list(new_roots), self.get_all_excludes(), self.scan_queue, self.scan_cancel,
+                        use_cache=use_cache)
+        self.after(SCAN_POLL_MS, self.poll_scan_queue, self.scan_queue)
+
+    def stop_scan(self):
+        # Drop any scan still running; its late messages go to a queue nobody polls
+        self.scan_cancel.set()
+        self.scan_queue = None
+        self.cancel_scan_btn.pack_forget()
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=0)
+        self.start_btn.config(state="normal")
+
+    def reset_tree(self):
+        # Anything that empties the scan index goes through here, so no scan
+        # can merge batches whose parent ids no longer exist
+        self.stop_scan()
+        self.tree.delete(*self.tree.get_children())
+        self.tree_nodes.clear()
+        self.scan_index.clear()
+        self.search_index.clear()
+        self.search_highlighted = []
+        self.search_opened = set()
+        self.search_matches = []
+        self.selection.clear()
+        self.update_total_selected_size()
+        self.row_num = 0  # Use instance variable so `insert_node` can access it
 
+    def poll_scan_queue(self, scan_queue):
+        if scan_queue is not self.scan_queue:
+            return  # a newer scan replaced this one
 
-    def insert_node(self, parent, path, is_root=False):
-        for pattern in self.exclude_patterns:
-            if pattern in path:
+        # Merge as many batches as fit in the time budget, then give Tk the rest of the tick
+        deadline = time.perf_counter() + SCAN_TIME_BUDGET
+        while time.perf_counter() < deadline:
+            try:
+                message = scan_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "finished":
+                self.finish_loading_tree()
                 return
+            merge_batch(self.scan_index, self.scan_streams, message)
+            self.search_index.update()
+
+        self.status_label.config(text=f"⏳ {len(self.scan_index) - self.scan_start} items scanned...")
+        self.after(SCAN_POLL_MS, self.poll_scan_queue, scan_queue)
+
+    def cancel_scan(self):
+        self.scan_cancel.set()
+
+    def finish_loading_tree(self):
+        index = self.scan_index
+        index.aggregate_sizes(self.scan_start)
+        if self.restore_paths:
+            self.selection.select_paths(self.restore_paths)
+            self.update_total_selected_size()
+        self.restore_paths = None
+
+        # Roots finish in any order; keep them in the order the folders were added
+        order = {path: i for i, path in enumerate(self.source_dirs)}
+        index.roots.sort(key=lambda r: order.get(index.name[r], len(order)))
+        for root_id in index.roots:
+            if str(root_id) not in self.tree_nodes:
+                self.insert_node("", root_id, index.name[root_id])
+
+        if self.scan_cancel.is_set():
+            self.status_label.config(text=f"⛔ Scan cancelled ({len(index)} items loaded)")
+        else:
+            self.status_label.config(text=f"✅ Loaded {len(index)} items")
+        self.scan_queue = None
+        self.cancel_scan_btn.pack_forget()
+        self.progress.stop()
+        self.progress.config(mode="determinate", value=0)
+        self.start_btn.config(state="normal")
 
-        name = os.path.basename(path)
-        try:
-            if os.path.isfile(path):
-                size = os.path.getsize(path)
-                date = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d %H:%M")
-            elif os.path.isdir(path):
-                size = self.get_folder_size_excluding(path)
-                date = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d %H:%M")
-            else:
-                size = 0
-                date = "?"
-            size_str = self.format_size(size)
-        except Exception as e:
-            print(f"Error reading size/date for {path}: {e}")
-            size_str = "?"
-            date = "?"
 
+    def insert_node(self, parent, node_id, path):
+        # Rows are filled from the scan index; the tree iid is the index node id.
+        # Folders only get a placeholder child until they are opened.
+        index = self.scan_index
         tags = ("evenrow",) if self.row_num % 2 == 0 else ("oddrow",)
-        node = self.tree.insert(parent, "end", text=name, values=("", size_str, date), tags=tags)
+        node = self.tree.insert(parent, "end", iid=str(node_id), text=os.path.basename(path),
+                                values=("", self.format_size(index.size[node_id]), self.format_date(index.mtime[node_id])),
+                                tags=tags, image=self.checkbox_images[self.check_state(node_id)])
         self.tree_nodes[node] = path
-        self.tree.item(node, image=self.checkbox_images["unchecked"])
         self.row_num += 1
 
-        if os.path.isdir(path):
-            try:
-                children = os.listdir(path)
-
-                # Sort by extension (for files) and then by name
-                children.sort(key=lambda x: (
-                    os.path.splitext(x)[1].lower() if os.path.isfile(os.path.join(path, x)) else '',
-                    x.lower()
-                ))
-
-                for child in children:
-                    self.insert_node(node, os.path.join(path, child))
-            except:
-                pass
+        if index.children.get(node_id):
+            self.tree.insert(node, "end", text="")
 
+    def populate_children(self, node):
+        children = self.tree.get_children(node)
+        if len(children) == 1 and self.tree.item(children[0], "text") == "":
+            self.tree.delete(children[0])  # remove dummy
 
-    def build_tree_multi(self):
-        self.tree.delete(*self.tree.get_children())
-        self.tree_nodes.clear()
-        self.checked_items.clear()
-        self.partial_checked_items.clear()
-        self.row_num = 0  # Use instance variable so `insert_node` can access it
+            folder_path = self.tree_nodes[node]
+            for child in self.scan_index.children.get(int(node), ()):
+                self.insert_node(node, child, os.path.join(folder_path, self.scan_index.name[child]))
 
-        for src in self.source_dirs:
-            self.insert_node("", src, is_root=True)
+    def ensure_row(self, node_id):
+        # Materialize every collapsed ancestor so the node has a row of its own
+        chain = []
+        while node_id >= 0 and str(node_id) not in self.tree_nodes:
+            chain.append(node_id)
+            node_id = self.scan_index.parent[node_id]
+        for n in reversed(chain):
+            self.populate_children(str(self.scan_index.parent[n]))
 
-        self.status_label.config(text=f"✅ Loaded {len(self.tree_nodes)} items")
-        self.progress.stop()
-        self.progress.config(mode="determinate", value=0)
-        self.start_btn.config(state="normal")
 
     def format_size(self, size):
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -304,6 +439,11 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
             size /= 1024
         return f"{size:.1f} TB"
 
+    def format_date(self, mtime):
+        if not mtime:
+            return "?"
+        return datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M")
+
     def on_tree_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
         column = self.tree.identify_column(event.x)
@@ -313,108 +453,131 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         if column == "#1":
             self.toggle_checkbox(row)
 
+    def check_state(self, node_id):
+        return self.selection.state(node_id)
+
+    def refresh_row_image(self, node_id):
+        # Only rows that were ever materialized exist in the widget
+        if str(node_id) in self.tree_nodes:
+            self.tree.item(str(node_id), image=self.checkbox_images[self.check_state(node_id)])
+
+    def refresh_visible(self, node_id):
+        # Redraw the row and whatever is shown below it; collapsed folders are
+        # brought up to date when they are opened (see on_tree_expand)
+        stack = [str(node_id)]
+        while stack:
+            node = stack.pop()
+            if node not in self.tree_nodes:
+                continue  # placeholder row
+            self.refresh_row_image(int(node))
+            if self.tree.item(node, "open"):
+                stack.extend(self.tree.get_children(node))
+
     def toggle_checkbox(self, node):
-        current_state = node in self.checked_items
-        new_state = not current_state
+        if node not in self.tree_nodes:
+            return  # placeholder row
+        node_id = int(node)
+        new_state = self.check_state(node_id) != "checked"
+
+        # The model only updates the ancestors; rows below follow on redraw
+        for ancestor in self.selection.set(node_id, new_state):
+            self.refresh_row_image(ancestor)
+        self.refresh_visible(node_id)
         self.update_total_selected_size()
 
-
-        def set_check_state(n, is_checked):
-            if is_checked:
-                self.checked_items.add(n)
-                self.partial_checked_items.discard(n)
-                self.tree.item(n, image=self.checkbox_images["checked"])
-            else:
-                self.checked_items.discard(n)
-                self.partial_checked_items.discard(n)
-                self.tree.item(n, image=self.checkbox_images["unchecked"])
-            if os.path.isdir(self.tree_nodes[n]):
-                for child in self.tree.get_children(n):
-                    set_check_state(child, is_checked)
-            self.update_parent_states(n)
-
-        set_check_state(node, new_state)
-
-    def update_parent_states(self, node):
-        parent = self.tree.parent(node)
-        if not parent:
-            return
-        children = self.tree.get_children(parent)
-        if not children:
-            return
-        checked = sum(1 for c in children if c in self.checked_items)
-        partial = sum(1 for c in children if c in self.partial_checked_items)
-        if checked == len(children):
-            self.checked_items.add(parent)
-            self.partial_checked_items.discard(parent)
-            self.tree.item(parent, image=self.checkbox_images["checked"])
-        elif checked > 0 or partial > 0:
-            self.checked_items.discard(parent)
-            self.partial_checked_items.add(parent)
-            self.tree.item(parent, image=self.checkbox_images["mixed"])
-        else:
-            self.checked_items.discard(parent)
-            self.partial_checked_items.discard(parent)
-            self.tree.item(parent, image=self.checkbox_images["unchecked"])
-        self.update_parent_states(parent)
-
     def select_all(self):
-
-        for node in self.tree_nodes:
-            self.tree.item(node, image=self.checkbox_images["checked"])
-            self.checked_items.add(node)
-            self.partial_checked_items.discard(node)
-
+        # One mark per root; only rows on screen are redrawn
+        self.selection.set_all(True)
+        for root in self.scan_index.roots:
+            self.refresh_visible(root)
         self.update_total_selected_size()
 
     def select_none(self):
-        for node in self.tree_nodes:
-            self.tree.item(node, image=self.checkbox_images["unchecked"])
-            self.checked_items.discard(node)
-            self.partial_checked_items.discard(node)
+        self.selection.set_all(False)
+        for root in self.scan_index.roots:
+            self.refresh_visible(root)
         self.update_total_selected_size()
 
 
     def filter_files(self, event):
-        search_term = self.search_entry.get().strip().lower()
-
-        # Remove highlight from all nodes
-        for node in self.tree_nodes:
-            self.tree.item(node, tags=())
-
+        # Debounced: only the last keystroke of a burst runs a search
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        search_term = self.search_entry.get().strip()
+        index = self.scan_index
+
+        # Undo the previous search only where it left its marks
+        for node in self.search_highlighted:
+            if node in self.tree_nodes:
+                tags = self.tree.item(node, "tags")
+                self.tree.item(node, tags=tuple(t for t in tags if t != "highlight"))
+        self.search_highlighted = []
+
+        self.search_matches = []
+        self.search_query = None
         if not search_term:
-            # Collapse all folders and reset styling
-            for node in self.tree_nodes:
-                self.tree.item(node, open=False)
+            # Collapse the folders the search opened
+            for node in self.search_opened:
+                if node in self.tree_nodes:
+                    self.tree.item(node, open=False)
+            self.search_opened = set()
             return
 
-        def recursive_search(node):
-            matched = False
-            name = self.tree.item(node, "text").lower()
-            path = self.tree_nodes.get(node, "").lower()
-
-            # Match current node
-            if search_term in name or search_term in path:
-                self.tree.item(node, tags=("highlight",))
-                matched = True
-
-            # Check children
-            for child in self.tree.get_children(node):
-                if recursive_search(child):
-                    matched = True
-                    self.tree.item(node, open=True)  # Expand if child matched
-
-            return matched
-
-        # Apply search from root
-        for root in self.tree.get_children():
-            recursive_search(root)
-
-        # Highlight style
-        self.tree.tag_configure("highlight", background="#ffffcc", font=("Segoe UI", 10, "bold"))
-
+        # e.g. "ext:sql size>10MB modified>7d -path:tests/", see search_query.py
+        try:
+            query = SearchQuery(search_term)
+        except ValueError as e:
+            self.status_label.config(text=f"⚠️ {e}")
+            return
+        self.search_query = query
+        self.search_matches = [node_id for node_id in query.run(index, self.search_index)
+                               # skip removed folders and ones still being scanned
+                               if str(index.root_of(node_id)) in self.tree_nodes]
+        total = len(self.search_matches)
+        matches = self.search_matches[:SEARCH_MAX_RESULTS]
+
+        for node_id in matches:
+            self.ensure_row(node_id)
+            node = str(node_id)
+            self.tree.item(node, tags=self.tree.item(node, "tags") + ("highlight",))
+            self.search_highlighted.append(node)
+            parent = index.parent[node_id]
+            while parent >= 0 and str(parent) not in self.search_opened:
+                self.tree.item(str(parent), open=True)  # Expand if child matched
+                self.search_opened.add(str(parent))
+                parent = index.parent[parent]
+
+        # Folders opened here skip on_tree_expand, so redraw what became visible
+        for root in index.roots:
+            self.refresh_visible(root)
+
+        shown = f" (showing first {SEARCH_MAX_RESULTS})" if total > SEARCH_MAX_RESULTS else ""
+        self.status_label.config(text=f"🔍 {total} matches{shown}")
+
+    def check_all_matches(self):
+        # Every match is checked, not only the highlighted ones. Plain name
+        # searches check matching folders whole; with filters or negations a
+        # folder's contents may not all match, so only its matching files are.
+        if not self.search_matches:
+            messagebox.showinfo("No Matches", "Search for something first.")
+            return
+        index = self.scan_index
+        query = self.search_query
+        whole_folders = not query.filters and not any(negated for negated, _ in query.names)
+        nodes = [n for n in self.search_matches if whole_folders or not index.children.get(n)]
+        self.selection.set_many(nodes, True)
+        for root in index.roots:
+            self.refresh_visible(root)
+        self.update_total_selected_size()
+        self.status_label.config(text=f"☑ Checked {len(nodes)} matches")
 
-    def start_copy(self):
+    def start_copy(self, resume=False):
+        if resume and self.start_btn.instate(["disabled"]):
+            return  # a copy or scan is already running
         # if not self.source_dir or not self.dest_entry.get().strip():
         if not  self.dest_entry.get().strip():
             messagebox.showwarning("Missing Path", "Please select source and destination folders.")
@@ -430,12 +593,9 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
             self.start_btn.config(state="disabled")
 
             # Prepare top-level selected folders
-            top_level_folders = []
-            for node in self.checked_items:
-                path = self.tree_nodes[node]
-                parent = self.tree.parent(node)
-                if os.path.isdir(path) and not parent:
-                    top_level_folders.append((os.path.basename(path), path))
+            index = self.scan_index
+            roots = [node for node in index.roots if self.check_state(node) == "checked" and index.is_dir[node]]
+            top_level_folders = [(os.path.basename(index.name[node]), index.name[node]) for node in roots]
 
             dest_dir = self.dest_entry.get().strip()
 
@@ -444,40 +604,35 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
                 self.start_btn.config(state="normal")  # ✅ Add this line
                 return
 
-            if len(top_level_folders) == 1:
-                zip_name = f"{top_level_folders[0][0]}.zip"
-            else:
-                all_names = [name for (name, _) in top_level_folders]
-                name_prefix = os.path.commonprefix(all_names).rstrip("-_")
-
-                all_paths = [path for (_, path) in top_level_folders]
-                common_root = os.path.commonpath(all_paths)
-                parent_name = os.path.basename(common_root)
+            zip_name = archive_name(top_level_folders, ARCHIVE_BACKENDS[self.archive_format.get()].extension)
 
-                if len(set(os.path.dirname(p) for (_, p) in top_level_folders)) == 1:
-                    zip_name = f"{parent_name}.zip" if parent_name else "smart-project.zip"
-                elif name_prefix:
-                    zip_name = f"{name_prefix}.zip"
-                else:
-                    zip_name = "smart-project.zip"
-
-            self.zip_manager.zip_selected(top_level_folders, dest_dir, zip_name)
+            # Archive straight from the index, which the scan already pruned of
+            # excluded folders, so the totals are known up front as well
+            estimate = (sum(1 for root in roots for node in index.iter_subtree(root) if not index.is_dir[node]),
+                        sum(index.size[root] for root in roots))
+            self.zip_manager.zip_selected(top_level_folders, dest_dir, zip_name, estimate,
+                                          iter_archive_entries(index, roots))
             self.start_btn.config(state="normal")  # ✅ Add this line
             return
         
+        if resume and not CopyJournal(self.dest_entry.get().strip()).exists():
+            messagebox.showinfo("Nothing to Resume", "No interrupted copy was found in the destination folder.")
+            return
+
         self.start_btn.config(state="disabled")
-        threading.Thread(target=self.copy_selected, daemon=True).start()
+        self.copy_selected(resume)
 
-    def copy_selected(self):
+    def copy_selected(self, resume=False):
         dest = self.dest_entry.get().strip()
         dest_root = dest  # just the destination folder itself
-        logger = CopyLogger(dest_root)
+        logger = CopyLogger()
         os.makedirs(dest_root, exist_ok=True)
-
-        selected_nodes = list(self.checked_items)
-        total_items = len(selected_nodes)
-        copied_bytes = 0
-        start_time = time.time()
+        index = self.scan_index
+        selection = self.selection.resolve()
+        matcher = ExcludeMatcher(self.get_all_excludes())
+        tracker = ProgressTracker()
+        engine = CopyEngine(self.copy_workers.get(), sync=self.sync_mode.get(), verify_hash=self.sync_verify.get(),
+                            journal=CopyJournal(dest_root), resume=resume)
 
         # Setup popup
         popup = tk.Toplevel(self)
@@ -495,7 +650,6 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         ttk.Label(popup, text="Copying files...", font=("Segoe UI", 12, "bold")).pack(pady=(10, 5))
         progress = ttk.Progressbar(popup, length=500, mode="determinate")
         progress.pack(pady=5)
-        progress["maximum"] = total_items
 
         file_label = ttk.Label(popup, text="Starting...", wraplength=550)
         file_label.pack(pady=5)
@@ -516,70 +670,69 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
         toggle_btn = ttk.Button(popup, text="Show Details", command=lambda: self.toggle_details(log_frame, toggle_btn))
         toggle_btn.pack()
 
+        # Called on a copy worker thread after every file; only touches the tracker
+        def on_file_done(job, error, skipped):
+            src_path, dst_path, size, label = job
+            if error is not None:
+                print(f"Error copying {src_path}: {error}")
+                logger.log_error(label, str(error))
+                tracker.item_done(label, error=error, log_line=f"[ERROR] {src_path} -> {error}")
+            elif skipped:
+                logger.log_skipped(label)
+                tracker.item_done(label, log_line=f"[SKIPPED] {label}")
+            else:
+                logger.log_success(label)
+                tracker.item_done(label, log_line=f"[OK] {label}")
+
+        # Runs on the Tk thread at a fixed rate, whatever the number of files
+        def render(snap):
+            total = snap["total_items"]
+            percent = snap["percent"]
+            progress.config(maximum=100, value=percent)
+            file_label.config(text=f"Copying ({snap['done_items']}/{total}): {snap['current'][:70]}")
+            percentage_label.config(text=f"{percent:.1f}%")
+            popup.title(f"Copying Files - {percent:.1f}%")
+            speed_label.config(text=f"Speed: {snap['speed'] / (1024 * 1024):.2f} MB/s   "
+                                    f"{self.format_size(snap['done_bytes'])} of {self.format_size(snap['total_bytes'])}   "
+                                    f"ETA: {format_eta(snap['eta'])}")
+            if snap["log_lines"]:
+                log_text.insert(tk.END, "\n".join(snap["log_lines"]) + "\n")
+
+        def on_finish(snap):
+            self.progress.config(value=0)
+            self.start_btn.config(state="normal")
+            logger.save()
+            if "error" in outcome:
+                file_label.config(text=f"❌ Error: {outcome['error']}")
+                speed_label.config(text="Failed")
+                self.status_label.config(text="❌ Copy failed")
+                messagebox.showerror("Copy Failed", str(outcome["error"]))
+                return
+            file_label.config(text="✅ Copy complete!")
+            speed_label.config(text="Done")
+            self.status_label.config(text="✅ Copy complete!")
+            messagebox.showinfo("Done", f"Files copied to:\n{dest_root}\n\nCopy method: {engine.strategy_summary()}")
+
         # Start copy in background thread
-        def copy_files():
-            nonlocal copied_bytes
-            for i, node in enumerate(selected_nodes, 1):
-                src_path = self.tree_nodes[node]
-
-                # Find which source root folder this path belongs to
-                matching_root = None
-                for root_folder in self.source_dirs:
-                    norm_src = os.path.normcase(os.path.normpath(src_path))
-                    norm_root = os.path.normcase(os.path.normpath(root_folder))
-                    if norm_src == norm_root or norm_src.startswith(norm_root + os.sep):
-                        matching_root = root_folder
-                        break
-
-                if matching_root is None:
-                    # fallback to first source folder (should not happen)
-                    matching_root = self.source_dirs[0]
-
-                # Compute relative path inside the matched source folder
-                rel_path = os.path.relpath(src_path, matching_root)
-
-                # Destination path includes the basename of the root source folder
-                dst_path = os.path.join(dest_root, os.path.basename(matching_root), rel_path)
-
-                # Update popup info
-                percent = (i / total_items) * 100
-                self.after(0, lambda rp=rel_path, idx=i, p=percent: [
-                    file_label.config(text=f"Copying ({idx}/{total_items}): {rp[:70]}"),
-                    progress.config(value=idx),
-                    percentage_label.config(text=f"{p:.1f}%"),
-                    popup.title(f"Copying Files - {p:.1f}%")
-                ])
-
-                try:
-                    if os.path.isdir(src_path):
-                        os.makedirs(dst_path, exist_ok=True)
-                    else:
-                        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                        shutil.copy2(src_path, dst_path)
-                        logger.log_success(os.path.join(os.path.basename(matching_root), rel_path))
-                        copied_bytes += os.path.getsize(src_path)
-                except Exception as e:
-                    print("Hey is this the error", e)
-                    self.after(0, lambda: log_text.insert(tk.END, f"[ERROR] {src_path} -> {e}\n"))
-                    logger.log_error(os.path.join(os.path.basename(matching_root), rel_path), str(e))
-                else:
-                    self.after(0, lambda: log_text.insert(tk.END, f"[OK] {os.path.join(os.path.basename(matching_root), rel_path)}\n"))
-
-                elapsed = time.time() - start_time
-                speed = copied_bytes / (elapsed + 1e-6) / (1024 * 1024)
-                self.after(0, lambda s=speed: speed_label.config(text=f"Speed: {s:.2f} MB/s"))
-
-            self.after(0, lambda: [
-                file_label.config(text="✅ Copy complete!"),
-                speed_label.config(text="Done"),
-                self.progress.config(value=0),
-                self.start_btn.config(state="normal"),
-                self.status_label.config(text="✅ Copy complete!"),
-                logger.save(),
-                messagebox.showinfo("Done", f"Files copied to:\n{dest_root}")
-            ])
+        outcome = {}
 
+        def copy_files():
+            try:
+                # Whole checked folders are expanded in one pass, files are taken as they are
+                dirs, jobs = copy_plan(index, selection, dest_root, matcher)
 
+                tracker.set_totals(len(jobs), sum(job[2] for job in jobs))
+                engine.run(jobs, dirs, on_file_done, tracker.add_bytes)
+            except Exception as e:
+                print(f"Copy failed: {e}")
+                outcome["error"] = e
+            finally:
+                summary = engine.strategy_summary()
+                print(f"Copy method: {summary}")
+                tracker.log(f"Copy method: {summary}")
+                tracker.finish()
+
+        poll_progress(self, tracker, render, on_finish)
         threading.Thread(target=copy_files, daemon=True).start()
 
     def toggle_details(self, frame, button):
@@ -608,11 +761,13 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
     def open_exclude_popup(self):
         popup = tk.Toplevel(self)
         popup.title("Exclude Items")
-        popup.geometry("400x200")
+        popup.geometry("400x230")
         popup.transient(self)
         popup.grab_set()
 
-        ttk.Label(popup, text="Enter patterns to exclude (comma-separated):").pack(pady=(15, 5), padx=10, anchor="w")
+        ttk.Label(popup, text="Enter patterns to exclude (comma-separated):").pack(pady=(15, 0), padx=10, anchor="w")
+        ttk.Label(popup, text="e.g. node_modules, *.log, /dist, build/, !keep.log",
+                  foreground="gray").pack(pady=(0, 5), padx=10, anchor="w")
 
         entry = tk.Text(popup, height=5)
         entry.pack(fill="both", padx=10, expand=True)
@@ -623,70 +778,69 @@ class FileCopierApp(TkinterDnD.Tk):  # ✅ Only use TkinterDnD.Tk
             self.exclude_patterns = [p.strip() for p in raw.split(",") if p.strip()]
             popup.destroy()
             messagebox.showinfo("Updated", f"Exclude list updated:\n{', '.join(self.exclude_patterns)}")
+            self.rescan_for_excludes()
 
         ttk.Button(popup, text="Save", command=save_and_close).pack(pady=(5, 15))
     
-    def on_tree_expand(self, event):
-        node = self.tree.focus()
-        children = self.tree.get_children(node)
-        if len(children) == 1 and self.tree.item(children[0], "text") == "":
-            self.tree.delete(children[0])  # remove dummy
+    def on_format_change(self, event=None):
+        # zstd goes up to 22; keep the level inside the chosen format's range
+        levels = ARCHIVE_BACKENDS[self.archive_format.get()].levels
+        self.level_spinbox.config(from_=levels[0], to=levels[-1])
+        try:
+            level = self.zip_level.get()
+        except tk.TclError:
+            level = ZIP_LEVEL
+        self.zip_level.set(min(max(level, levels[0]), levels[-1]))
+
+    def rescan_for_excludes(self):
+        # The scan cache keeps unfiltered listings, so this reload is quick
+        if getattr(self, "source_dirs", None):
+            self.start_loading_tree_multi()
 
-            folder_path = self.tree_nodes.get(node)
-            if not folder_path or not os.path.isdir(folder_path):
-                return
+    def get_dynamic_excludes(self):
+        return project_excludes(p for p, var in self.project_types.items() if var.get())
 
-            try:
-                for child_name in sorted(os.listdir(folder_path)):
-                    child_path = os.path.join(folder_path, child_name)
-                    self.insert_node(node, child_path)
-            except Exception as e:
-                print("Expand error:", e)
+    def get_all_excludes(self):
+        # UI patterns plus those of the selected project types; used by scan, copy and zip alike
+        return merge_excludes(self.exclude_patterns, self.get_dynamic_excludes())
 
-    def update_total_selected_size(self):
-        total = 0
+    def chechbox_project_type_dropdown(self):
+        self.project_types = {}
+        project_options = list(PROJECT_EXCLUDES.keys())
 
-        for node in self.checked_items:
-            path = self.tree_nodes[node]
+        # Frame for dropdown
+        project_frame = ttk.Frame(self)
+        project_frame.pack(fill="x", padx=15, pady=(0, 10))
+        ttk.Label(project_frame, text="Project Type:").pack(side="left")
 
-            # Skip if any parent is already counted
-            parent = self.tree.parent(node)
-            skip = False
-            while parent:
-                if parent in self.checked_items:
-                    skip = True
-                    break
-                parent = self.tree.parent(parent)
+        # Dropdown with checkboxes (using Menu)
+        self.dropdown_btn = ttk.Menubutton(project_frame, text="Select Project Types", direction="below")
+        self.menu = tk.Menu(self.dropdown_btn, tearoff=0)
 
-            if skip:
-                continue
+        for project in project_options:
+            var = tk.BooleanVar()
+            self.project_types[project] = var
+            self.menu.add_checkbutton(label=project, variable=var, command=self.rescan_for_excludes)
 
-            try:
-                if os.path.isfile(path):
-                    total += os.path.getsize(path)
-                elif os.path.isdir(path):
-                    total += self.get_folder_size_excluding(path)
-            except:
-                continue
+        self.dropdown_btn["menu"] = self.menu
+        self.dropdown_btn.pack(side="left", padx=5)
+
+    def detect_project_types(self, folder_paths):
+        return detect_project_types(folder_paths)
 
+    def on_tree_expand(self, event):
+        node = self.tree.focus()
+        if node in self.tree_nodes:
+            self.populate_children(node)
+            # <<TreeviewOpen>> fires before the row is marked open, so start at
+            # the children; rows further down may still be open from before
+            for child in self.tree.get_children(node):
+                self.refresh_visible(child)
+
+    def update_total_selected_size(self):
+        total = self.selection.selected_bytes()
         size_str = self.format_size(total)
         self.total_size_label.config(text=f"Total Size: {size_str}")
-    
-    def get_folder_size_excluding(self,path, exclude_dirs=None):
-        total_size = 0
-        exclude_dirs = exclude_dirs or self.exclude_patterns
-
-        for dirpath, dirnames, filenames in os.walk(path):
-            # Skip excluded directories
-            if any(excluded in dirpath for excluded in exclude_dirs):
-                continue
-            for f in filenames:
-                try:
-                    fp = os.path.join(dirpath, f)
-                    total_size += os.path.getsize(fp)
-                except:
-                    pass
-        return total_size
 
 
 def choose_multiple_folders():
@@ -0,0 +1,129 @@
+# progress.py
+import math
+import time
+import threading
+
+PROGRESS_POLL_MS = 100  # the UI redraws progress at 10 Hz, however fast files finish
+SPEED_SMOOTHING = 3.0  # seconds; time constant of the throughput average
+
+
+class ProgressTracker:
+    # Shared between worker threads, which only bump counters under a lock, and
+    # the Tk thread, which polls snapshot() on a timer. UI work therefore scales
+    # with elapsed time instead of with the number of files.
+    def __init__(self, total_items=0, total_bytes=0):
+        self.lock = threading.Lock()
+        self.total_items = total_items
+        self.total_bytes = total_bytes
+        self.done_items = 0
+        self.done_bytes = 0
+        self.errors = 0
+        self.current = ""
+        self.log_lines = []
+        self.start_time = time.time()
+        self.finished = False
+        self.rate = None
+        self.rate_time = self.start_time
+        self.rate_bytes = 0
+
+    def set_totals(self, total_items, total_bytes=0):
+        with self.lock:
+            self.total_items = total_items
+            self.total_bytes = total_bytes
+
+    def start_item(self, label):
+        self.current = label
+
+    def add_bytes(self, nbytes):
+        # Chunk-level progress from inside a file
+        with self.lock:
+            self.done_bytes += nbytes
+
+    def item_done(self, label, nbytes=0, error=None, log_line=None):
+        with self.lock:
+            self.done_items += 1
+            self.done_bytes += nbytes
+            self.current = label
+            if error is not None:
+                self.errors += 1
+            if log_line is not None:
+                self.log_lines.append(log_line)
+
+    def log(self, line):
+        with self.lock:
+            self.log_lines.append(line)
+
+    def finish(self):
+        with self.lock:
+            self.finished = True
+
+    def snapshot(self):
+        # Consistent copy of the counters; pending log lines are handed over once
+        with self.lock:
+            snap = {
+                "done_items": self.done_items,
+                "total_items": self.total_items,
+                "done_bytes": self.done_bytes,
+                "total_bytes": self.total_bytes,
+                "errors": self.errors,
+                "current": self.current,
+                "log_lines": self.log_lines,
+                "finished": self.finished,
+            }
+            self.log_lines = []
+        now = time.time()
+        snap["elapsed"] = now - self.start_time
+        snap["speed"] = self.update_rate(now, snap["done_bytes"])
+
+        # Bytes when the totals are known, so one 4 GB file isn't a single tick
+        if snap["total_bytes"]:
+            snap["percent"] = min(snap["done_bytes"] / snap["total_bytes"] * 100, 100.0)
+            remaining = snap["total_bytes"] - snap["done_bytes"]
+            snap["eta"] = remaining / snap["speed"] if snap["speed"] > 0 and remaining > 0 else None
+        else:
+            snap["percent"] = (snap["done_items"] / snap["total_items"] * 100) if snap["total_items"] else 0.0
+            done = snap["done_items"]
+            if done and snap["total_items"] > done:
+                snap["eta"] = snap["elapsed"] / done * (snap["total_items"] - done)
+            else:
+                snap["eta"] = None
+        return snap
+
+    def update_rate(self, now, done_bytes):
+        # Exponentially weighted bytes/s, so the speed and ETA don't jump
+        # around between small and large files
+        dt = now - self.rate_time
+        if dt <= 0:
+            return self.rate or 0.0
+        sample = (done_bytes - self.rate_bytes) / dt
+        if self.rate is None:
+            self.rate = sample
+        else:
+            weight = 1 - math.exp(-dt / SPEED_SMOOTHING)
+            self.rate += weight * (sample - self.rate)
+        self.rate_time, self.rate_bytes = now, done_bytes
+        return self.rate
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def poll_progress(widget, tracker, render, on_finish=None, interval=PROGRESS_POLL_MS):
+    # Calls render(snapshot) on the Tk thread every interval ms until the
+    # tracker is finished, then renders once more and calls on_finish(snapshot).
+    def tick():
+        snap = tracker.snapshot()
+        render(snap)
+        if snap["finished"]:
+            if on_finish is not None:
+                on_finish(snap)
+        else:
+            widget.after(interval, tick)
+
+    widget.after(interval, tick)
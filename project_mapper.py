@@ -1,4 +1,8 @@
 # project_mapper.py
+import os
+
+DEFAULT_EXCLUDES = ["node_modules"]
+
 PROJECT_EXCLUDES = {
     "Python": ["__pycache__", "venv", "env", "build", "dist"],
     "Java": ["target", "out", ".idea", ".settings"],
@@ -9,3 +13,39 @@ PROJECT_EXCLUDES = {
     "PHP": ["vendor"],
     "Node.js": ["node_modules"],
 }
+
+
+def detect_project_types(folder_paths):
+    detected = set()
+    for folder in folder_paths:
+        try:
+            items = set(os.listdir(folder))
+            if "angular.json" in items:
+                detected.add("Angular")
+            if "package.json" in items:
+                if "angular.json" not in items:
+                    detected.add("React")  # fallback if angular not present
+                if "app.js" in items or "server.js" in items:
+                    detected.add("Node.js")
+            if "composer.json" in items:
+                detected.add("Laravel")
+                detected.add("PHP")
+            if "requirements.txt" in items or "venv" in items or "__pycache__" in items:
+                detected.add("Python")
+            if "pom.xml" in items or "build.gradle" in items:
+                detected.add("Java")
+        except Exception as e:
+            print(f"Error scanning {folder}: {e}")
+    return detected
+
+
+def project_excludes(project_types):
+    exclude_dirs = set()
+    for project in project_types:
+        exclude_dirs.update(PROJECT_EXCLUDES.get(project, []))
+    return exclude_dirs
+
+
+def merge_excludes(patterns, extra):
+    # User patterns first, in their order; negations only apply to what precedes them
+    return list(patterns) + sorted(set(extra) - set(patterns))
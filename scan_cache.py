@@ -0,0 +1,59 @@
+# scan_cache.py
+import os
+import marshal
+import hashlib
+
+CACHE_DIR = os.path.join("Output", "scan_cache")
+
+
+def user_cache_dir():
+    # For callers that can't rely on the working directory, such as the CLI under cron
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "smart-project-copier", "scan_cache")
+CACHE_VERSION = 2
+
+
+class ScanCache:
+    # Raw folder listings of one source root from the previous scan, keyed by
+    # folder path: dir_path -> (folder mtime, [(name, size, mtime, is_dir, descend), ...]).
+    # A folder's mtime only changes when entries are added, removed or renamed,
+    # so cached file sizes and dates can be stale; whoever acts on them stats again.
+    def __init__(self, root_path, cache_dir=CACHE_DIR):
+        key = hashlib.sha1(os.path.normcase(os.path.abspath(root_path)).encode("utf-8")).hexdigest()
+        self.cache_path = os.path.join(cache_dir, f"{key}.bin")
+        self.root_path = root_path
+        self.old = self.load()
+        self.new = {}
+
+    def load(self):
+        try:
+            # One read, then loads: marshal.load on a file object reads in tiny pieces
+            with open(self.cache_path, "rb") as f:
+                version, root_path, listings = marshal.loads(f.read())
+            if version == CACHE_VERSION and root_path == self.root_path:
+                return listings
+        except Exception:
+            pass
+        return {}
+
+    def lookup(self, dir_path, mtime):
+        cached = self.old.get(dir_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        return None
+
+    def store(self, dir_path, mtime, entries):
+        self.new[dir_path] = (mtime, entries)
+
+    def save(self):
+        # Only folders seen by this scan are kept, so deleted and newly
+        # excluded folders drop out of the cache on their own
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(marshal.dumps((CACHE_VERSION, self.root_path, self.new)))
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"Could not save scan cache for {self.root_path}: {e}")
@@ -0,0 +1,337 @@
+# scanner.py
+import os
+import queue
+import itertools
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from scan_cache import ScanCache, CACHE_DIR
+from exclude_matcher import ExcludeMatcher
+
+BATCH_SIZE = 1000
+SCAN_WORKERS = 8  # directory listing is I/O bound, so more threads than cores pays off
+FANOUT_DEPTH = 2  # folders this close to a root are scanned as separate pool tasks
+LINK = "link"  # descend value of a symlinked folder
+
+
+class ScanIndex:
+    # Flat, column-per-field index of everything found under the source roots.
+    # A node id is the node's position in every column; roots have parent -1
+    # and keep their full source path as name.
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.parent = array("q")
+        self.name = []
+        self.size = array("q")
+        self.leaves = array("q")  # files and empty folders in the subtree, after aggregate_sizes
+        self.mtime = array("d")
+        self.is_dir = bytearray()
+        self.children = {}
+        self.roots = []
+
+    def __len__(self):
+        return len(self.name)
+
+    def add(self, parent, name, size, mtime, is_dir):
+        node_id = len(self.name)
+        self.parent.append(parent)
+        self.name.append(name)
+        self.size.append(size)
+        self.leaves.append(0 if is_dir else 1)
+        self.mtime.append(mtime)
+        self.is_dir.append(1 if is_dir else 0)
+        if is_dir:
+            self.children[node_id] = []
+        if parent < 0:
+            self.roots.append(node_id)
+        else:
+            self.children[parent].append(node_id)
+        return node_id
+
+    def path(self, node_id):
+        parts = []
+        while node_id >= 0:
+            parts.append(self.name[node_id])
+            node_id = self.parent[node_id]
+        return os.path.join(*reversed(parts))
+
+    def add_records(self, id_map, anchor, records):
+        # Merge scanner records whose parent ids are local to one scan stream;
+        # id_map collects the index id of every record in that stream.
+        for parent, name, size, mtime, is_dir in records:
+            id_map.append(self.add(id_map[parent] if parent >= 0 else anchor, name, size, mtime, is_dir))
+
+    def iter_subtree(self, node_id):
+        stack = [node_id]
+        while stack:
+            node_id = stack.pop()
+            yield node_id
+            stack.extend(self.children.get(node_id, ()))
+
+    def aggregate_sizes(self, start=0):
+        # Children always get higher ids than their folder, so a single reverse
+        # pass over the new nodes rolls every file size (and leaf count) up
+        # into all ancestors. An empty folder counts as a leaf of its own.
+        parent, size, leaves, is_dir = self.parent, self.size, self.leaves, self.is_dir
+        for node_id in range(len(self.name) - 1, start - 1, -1):
+            if is_dir[node_id] and not leaves[node_id]:
+                leaves[node_id] = 1
+            p = parent[node_id]
+            if p >= 0:
+                size[p] += size[node_id]
+                leaves[p] += leaves[node_id]
+
+    def root_of(self, node_id):
+        while self.parent[node_id] >= 0:
+            node_id = self.parent[node_id]
+        return node_id
+
+
+def sort_key(name, is_dir):
+    # Same order the tree always used: by extension (files only), then by name
+    return (os.path.splitext(name)[1].lower() if not is_dir else "", name.lower())
+
+
+def read_dir(dir_path):
+    # One scandir pass; DirEntry caches is_dir and (on Windows) the stat data,
+    # so every entry costs at most one extra syscall.
+    entries = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                    st = entry.stat()
+                    size = 0 if is_dir else st.st_size
+                    mtime = st.st_mtime
+                    # Linked folders are followed, but checked for loops before the walk enters them
+                    descend = (LINK if entry.is_symlink() else True) if is_dir else False
+                except OSError as e:
+                    print(f"Error reading size/date for {entry.path}: {e}")
+                    is_dir, size, mtime, descend = False, 0, 0.0, False
+                entries.append((entry.name, size, mtime, is_dir, descend))
+    except OSError:
+        return []
+    entries.sort(key=lambda e: sort_key(e[0], e[3]))
+    return entries
+
+
+def link_loops(link_path):
+    # True when a symlinked folder resolves to one of the folders it sits in,
+    # which would make the walk go round forever
+    try:
+        st = os.stat(link_path)
+    except OSError:
+        return True
+    target = (st.st_dev, st.st_ino)
+    path = os.path.dirname(link_path)
+    while True:
+        try:
+            st = os.stat(path)
+            if (st.st_dev, st.st_ino) == target:
+                return True
+        except OSError:
+            pass
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+        path = parent
+
+
+def _restat_dir(dir_path, entry):
+    name, size, mtime, is_dir, descend = entry
+    try:
+        mtime = os.stat(os.path.join(dir_path, name)).st_mtime
+    except OSError:
+        pass
+    return (name, size, mtime, is_dir, descend)
+
+
+def list_dir(dir_path, excluded=None, mtime=None, cache=None):
+    # excluded(path, is_dir) comes from ExcludeMatcher.for_root
+    entries = None
+    if cache is not None:
+        entries = cache.lookup(dir_path, mtime)
+        if entries is not None:
+            # Sub-folders still need a fresh mtime, or changes below them would go
+            # unseen. Files keep their cached size and date: a file edited in place
+            # doesn't touch its folder, so anything that acts on the numbers
+            # (sync, zip, the size/modified search filters) stats the file itself.
+            entries = [_restat_dir(dir_path, e) if e[3] else e for e in entries]
+    if entries is None:
+        entries = read_dir(dir_path)
+    if cache is not None:
+        cache.store(dir_path, mtime, entries)
+    if excluded is None:
+        return entries
+    return [e for e in entries if not excluded(os.path.join(dir_path, e[0]), e[3])]
+
+
+def _walk(stack, next_id, batch, excluded=None, cancel_event=None, batch_size=BATCH_SIZE,
+          fan_out=None, cache=None):
+    # Depth-first walk of the (record id, path, depth, mtime) folders on the
+    # stack, yielding record batches. When fan_out is given, folders shallower
+    # than FANOUT_DEPTH are handed to it instead of being walked here.
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        dir_id, dir_path, depth, dir_mtime = stack.pop()
+        for name, size, mtime, is_dir, descend in list_dir(dir_path, excluded, dir_mtime, cache):
+            batch.append((dir_id, name, size, mtime, is_dir))
+            if descend == LINK and link_loops(os.path.join(dir_path, name)):
+                print(f"Not following {os.path.join(dir_path, name)}: the link points back into its own folder")
+                descend = False
+            if descend:
+                child = (next_id, os.path.join(dir_path, name), depth + 1, mtime)
+                if fan_out is not None and depth < FANOUT_DEPTH:
+                    # The folder's own record has to reach the index before its children do
+                    yield batch
+                    batch = []
+                    fan_out(child)
+                else:
+                    stack.append(child)
+            next_id += 1
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_root_batches(root_path, excluded=None, cancel_event=None, batch_size=BATCH_SIZE,
+                      fan_out=None, cache=None):
+    # Yields lists of (parent, name, size, mtime, is_dir) records. Parent ids
+    # are positions in this stream; the root itself is record 0 with parent -1.
+    # Excluded folders are dropped from their parent's listing, so they are never walked.
+    try:
+        mtime = os.stat(root_path).st_mtime
+    except OSError as e:
+        print(f"Error scanning {root_path}: {e}")
+        return
+
+    # Folders start at 0 bytes; aggregate_sizes fills them in once the walk is done
+    root_record = (-1, root_path, 0, mtime, True)
+    yield from _walk([(0, root_path, 0, mtime)], 1, [root_record], excluded, cancel_event, batch_size,
+                     fan_out, cache)
+
+
+def scan_root(index, root_path, exclude_patterns=(), use_cache=True, cache_dir=CACHE_DIR):
+    start = len(index)
+    id_map = []
+    cache = ScanCache(root_path, cache_dir) if use_cache else None
+    excluded = ExcludeMatcher(exclude_patterns).for_root(root_path)
+    for batch in iter_root_batches(root_path, excluded, cache=cache):
+        index.add_records(id_map, -1, batch)
+    if not id_map:
+        return None
+    if cache is not None:
+        cache.save()
+    index.aggregate_sizes(start)
+    return id_map[0]
+
+
+class _ParallelScan:
+    # Every root, and every folder within FANOUT_DEPTH of a root, is its own
+    # record stream scanned by a pool task. A sub-folder stream is anchored on
+    # the (stream, record id) of its folder in the parent stream.
+    def __init__(self, exclude_patterns, out_queue, cancel_event, workers, use_cache, cache_dir):
+        self.matcher = ExcludeMatcher(exclude_patterns)  # compiled once for every root and task
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.caches = []
+        self.out_queue = out_queue
+        self.cancel_event = cancel_event
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+        self.streams = itertools.count()
+        self.lock = threading.Lock()
+        self.pending = 1  # held by the caller until every root is submitted
+
+    def submit(self, fn, *args):
+        with self.lock:
+            self.pending += 1
+        self.pool.submit(self.run_task, fn, *args)
+
+    def run_task(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Error scanning: {e}")
+        finally:
+            self.task_done()
+
+    def task_done(self):
+        with self.lock:
+            self.pending -= 1
+            finished = self.pending == 0
+        if finished:
+            self.out_queue.put(("finished",))
+            self.pool.shutdown(wait=False)
+            # A cancelled scan saw only part of the tree; keep the previous cache then
+            if not self.cancel_event.is_set():
+                for cache in self.caches:
+                    cache.save()
+
+    def scan_root(self, root_path):
+        stream = next(self.streams)
+        cache = None
+        if self.use_cache:
+            cache = ScanCache(root_path, self.cache_dir)
+            self.caches.append(cache)
+        excluded = self.matcher.for_root(root_path)
+        fan_out = lambda child: self.submit(self.scan_folder, stream, child, cache, excluded)
+        for batch in iter_root_batches(root_path, excluded, self.cancel_event,
+                                       fan_out=fan_out, cache=cache):
+            self.out_queue.put(("batch", stream, None, batch))
+
+    def scan_folder(self, parent_stream, folder, cache, excluded):
+        record_id, folder_path, depth, mtime = folder
+        stream = next(self.streams)
+        fan_out = lambda child: self.submit(self.scan_folder, stream, child, cache, excluded)
+        for batch in _walk([(-1, folder_path, depth, mtime)], 0, [], excluded, self.cancel_event,
+                           fan_out=fan_out, cache=cache):
+            self.out_queue.put(("batch", stream, (parent_stream, record_id), batch))
+
+
+def scan_into_queue(roots, exclude_patterns, out_queue, cancel_event, workers=SCAN_WORKERS, use_cache=True,
+                    cache_dir=CACHE_DIR):
+    # Producer side of the tree loader. Returns immediately; pool threads put
+    # ("batch", stream, anchor, records) messages on out_queue and a single
+    # ("finished",) once everything is scanned. Nothing here touches Tk.
+    scan = _ParallelScan(exclude_patterns, out_queue, cancel_event, workers, use_cache, cache_dir)
+    for root_path in roots:
+        scan.submit(scan.scan_root, root_path)
+    scan.task_done()
+
+
+def merge_batch(index, streams, message):
+    # Consumer side: adds one ("batch", ...) message to index. streams maps
+    # each stream to the node ids it has produced so far.
+    _, stream, anchor, records = message
+    # Sub-folder streams hang off a record of the stream that found the folder
+    anchor_id = -1 if anchor is None else streams[anchor[0]][anchor[1]]
+    index.add_records(streams.setdefault(stream, []), anchor_id, records)
+
+
+def scan_parallel(index, roots, exclude_patterns=(), workers=SCAN_WORKERS, use_cache=True,
+                  cancel_event=None, on_batch=None, cache_dir=CACHE_DIR):
+    # Blocking variant of scan_into_queue for callers without an event loop.
+    # Roots end up in index.roots in the order given.
+    cancel_event = cancel_event or threading.Event()
+    out_queue = queue.Queue()
+    start = len(index)
+    streams = {}
+    scan_into_queue(list(roots), exclude_patterns, out_queue, cancel_event, workers, use_cache, cache_dir)
+    while True:
+        message = out_queue.get()
+        if message[0] == "finished":
+            break
+        merge_batch(index, streams, message)
+        if on_batch:
+            on_batch(len(index) - start)
+    index.aggregate_sizes(start)
+    order = {path: i for i, path in enumerate(roots)}
+    index.roots.sort(key=lambda r: order.get(index.name[r], len(order)))
+    return not cancel_event.is_set()
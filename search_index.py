@@ -0,0 +1,71 @@
+# search_index.py
+from array import array
+
+SEARCH_DEBOUNCE_MS = 250  # wait for a pause in typing before searching
+SEARCH_MAX_RESULTS = 500  # rows materialized and highlighted per search
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    # Lowercased names plus trigram postings for every node of a ScanIndex,
+    # kept up to date batch by batch while the scan merges. A query is the
+    # intersection of its trigrams' postings, then a substring check.
+    def __init__(self, index):
+        self.index = index
+        self.clear()
+
+    def clear(self):
+        self.lower = []
+        self.postings = {}
+        self.last_query = None
+        self.last_results = None
+
+    def update(self):
+        # Index whatever the scan index gained since the last call
+        start = len(self.lower)
+        names = self.index.name
+        postings = self.postings
+        for node_id in range(start, len(names)):
+            name = names[node_id].lower()
+            self.lower.append(name)
+            for gram in trigrams(name):
+                ids = postings.get(gram)
+                if ids is None:
+                    ids = postings[gram] = array("i")
+                ids.append(node_id)
+        if len(self.lower) != start:
+            self.last_query = None  # cached results don't cover the new nodes
+
+    def candidates(self, term):
+        if len(term) < 3:
+            return range(len(self.lower))
+        lists = []
+        for gram in trigrams(term):
+            ids = self.postings.get(gram)
+            if ids is None:
+                return []
+            lists.append(ids)
+        lists.sort(key=len)
+        result = lists[0]
+        for ids in lists[1:]:
+            keep = set(ids)
+            result = [n for n in result if n in keep]
+            if not result:
+                break
+        return result
+
+    def search(self, term):
+        # Node ids whose name contains term, in id order. Extending the
+        # previous query only re-checks its results instead of the index.
+        term = term.lower()
+        if self.last_query and self.last_query in term:
+            pool = self.last_results
+        else:
+            pool = self.candidates(term)
+        lower = self.lower
+        results = [n for n in pool if term in lower[n]]
+        self.last_query, self.last_results = term, results
+        return results
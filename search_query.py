@@ -0,0 +1,166 @@
+# search_query.py
+import os
+import re
+import time
+from datetime import datetime
+
+# Search box syntax; terms are ANDed, a leading "-" negates any of them:
+#   report          name contains "report"
+#   ext:sql,csv     file extension
+#   size>10MB       size (B, KB, MB, GB, TB; also k/m/g); >, >=, <, <=, =
+#   modified>7d     modified after a point in time: a date (2024-05-01, 2024-05,
+#                   2024-05-01T12:00) or an age in h/d/w ago, so modified>7d
+#                   means "this week"
+#   path:src/api    full path contains the text (folders end in "/")
+#   -path:tests/    everything except what is under a tests folder
+
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2,
+              "g": 1024 ** 3, "gb": 1024 ** 3, "t": 1024 ** 4, "tb": 1024 ** 4}
+AGE_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400}
+COMPARE = re.compile(r"^(size|modified)(>=|<=|>|<|=)(.+)$")
+OPERATORS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    "=": lambda a, b: a == b,
+}
+
+
+def parse_size(text):
+    match = re.match(r"^(\d+(?:\.\d+)?)\s*([a-z]*)$", text.lower())
+    if not match or match.group(2) not in SIZE_UNITS:
+        raise ValueError(f"Bad size: {text}")
+    return float(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def parse_time(text, now=None):
+    text = text.lower()
+    match = re.match(r"^(\d+(?:\.\d+)?)([hdw])$", text)
+    if match:
+        return (now or time.time()) - float(match.group(1)) * AGE_UNITS[match.group(2)]
+    # Terms are split on whitespace, so a time of day joins the date with a "T"
+    for fmt in ("%Y-%m-%d", "%Y-%m-%dt%H:%M", "%Y-%m"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"Bad date: {text}")
+
+
+class SearchQuery:
+    def __init__(self, text, now=None):
+        self.names = []       # (negated, lowercased text)
+        self.filters = []     # (negated, kind, value); kind is ext, size, modified or path
+        for token in text.split():
+            negated = token.startswith("-") and len(token) > 1
+            if negated:
+                token = token[1:]
+            key, sep, value = token.partition(":")
+            key = key.lower()
+            compare = COMPARE.match(token.lower())
+            if sep and key == "ext" and value:
+                exts = {"." + e.lstrip(".").lower() for e in value.split(",") if e.strip(".")}
+                self.filters.append((negated, "ext", exts))
+            elif sep and key == "path" and value:
+                self.filters.append((negated, "path", value.lower().replace("\\", "/")))
+            elif compare:
+                kind, op, raw = compare.groups()
+                limit = parse_size(raw) if kind == "size" else parse_time(raw, now)
+                self.filters.append((negated, kind, (OPERATORS[op], limit)))
+            else:
+                self.names.append((negated, token.lower()))
+
+    def __bool__(self):
+        return bool(self.names or self.filters)
+
+    def run(self, index, search_index):
+        # Node ids matching every term, in id order. The first plain name term
+        # goes through the trigram index; everything else is a batched pass
+        # over the current id list against the index columns.
+        search_index.update()
+        lower = search_index.lower
+        ids = None
+        for negated, term in self.names:
+            if ids is None and not negated:
+                ids = search_index.search(term)
+            elif negated:
+                ids = [n for n in (ids if ids is not None else range(len(lower))) if term not in lower[n]]
+            else:
+                ids = [n for n in ids if term in lower[n]]
+        if ids is None:
+            ids = range(len(index))
+
+        is_dir = index.is_dir
+        stats = FreshStats(index)
+        # Size and date filters stat files, so they go last and only see what the
+        # cheaper filters let through
+        for negated, kind, value in sorted(self.filters, key=lambda f: f[1] in ("size", "modified")):
+            if kind == "ext":
+                keep = lambda n, exts=value: not is_dir[n] and os.path.splitext(lower[n])[1] in exts
+            elif kind == "size":
+                op, limit = value
+                keep = lambda n, op=op, limit=limit: op(stats.get(n)[0], limit)
+            elif kind == "modified":
+                op, limit = value
+                keep = lambda n, op=op, limit=limit: op(stats.get(n)[1], limit)
+            else:
+                paths = PathCache(index)
+                keep = lambda n, text=value, paths=paths: text in paths.get(n)
+            ids = [n for n in ids if keep(n) != negated]
+        return list(ids)
+
+
+class PathCache:
+    # Lowercased "/"-separated paths, built from memoized parent folders so a
+    # batch of siblings costs one join each instead of a walk to the root
+    def __init__(self, index):
+        self.index = index
+        self.dirs = {}
+
+    def folder(self, node):
+        path = self.dirs.get(node)
+        if path is None:
+            parent = self.index.parent[node]
+            name = self.index.name[node].lower().replace("\\", "/").rstrip("/")
+            path = (self.folder(parent) if parent >= 0 else "") + name + "/"
+            self.dirs[node] = path
+        return path
+
+    def get(self, node):
+        if self.index.is_dir[node]:
+            return self.folder(node)
+        parent = self.index.parent[node]
+        return (self.folder(parent) if parent >= 0 else "") + self.index.name[node].lower()
+
+
+class FreshStats:
+    # (size, mtime) straight from disk for files: the scan cache keeps a file's
+    # listing until its folder changes, and editing a file in place doesn't.
+    # Folders keep their aggregated size and scanned date.
+    def __init__(self, index):
+        self.index = index
+        self.stats = {}
+        self.dirs = {}
+
+    def folder(self, node):
+        path = self.dirs.get(node)
+        if path is None:
+            parent = self.index.parent[node]
+            name = self.index.name[node]
+            path = self.dirs[node] = os.path.join(self.folder(parent), name) if parent >= 0 else name
+        return path
+
+    def get(self, node):
+        stat = self.stats.get(node)
+        if stat is None:
+            index = self.index
+            stat = (index.size[node], index.mtime[node])
+            if not index.is_dir[node]:
+                try:
+                    st = os.stat(os.path.join(self.folder(index.parent[node]), index.name[node]))
+                    stat = (st.st_size, st.st_mtime)
+                except OSError:
+                    pass
+            self.stats[node] = stat
+        return stat
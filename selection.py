@@ -0,0 +1,259 @@
+# selection.py
+import os
+
+
+class SelectionModel:
+    # Checkbox state over the scan index without a per-node set. A mark on a
+    # node sets the state of its whole subtree, deeper marks override it, and
+    # unmarked nodes inherit. Folders whose selected leaf count differs from
+    # what they inherit keep it in sel_count/sel_bytes; every other folder is
+    # uniformly checked or unchecked. A toggle therefore only touches the
+    # ancestors of the node, never its subtree. Select All / None are a mark
+    # per root, and the selected byte total is kept as a running sum.
+    def __init__(self, index):
+        self.index = index
+        self.clear()
+
+    def clear(self):
+        self.marks = {}
+        self.sel_count = {}
+        self.sel_bytes = {}
+        self.marked_below = {}  # folder -> marks strictly inside it, so toggles can skip unmarked subtrees
+        self.total_bytes = 0
+
+    def inherited(self, node):
+        while node >= 0:
+            if node in self.marks:
+                return self.marks[node]
+            node = self.index.parent[node]
+        return False
+
+    def counts(self, node, marked):
+        # Selected (leaves, bytes) under node, given its effective mark
+        if node in self.sel_count:
+            return self.sel_count[node], self.sel_bytes[node]
+        if marked:
+            return self.index.leaves[node], self.index.size[node]
+        return 0, 0
+
+    def state(self, node):
+        if node in self.sel_count:
+            count = self.sel_count[node]
+            if count == self.index.leaves[node]:
+                return "checked"
+            return "mixed" if count else "unchecked"
+        return "checked" if self.inherited(node) else "unchecked"
+
+    def is_below(self, node, ancestor):
+        # Ids grow downwards, so anything not above the ancestor's id is skipped cheaply
+        if node <= ancestor:
+            return False
+        parent = self.index.parent
+        while node > ancestor:
+            node = parent[node]
+        return node == ancestor
+
+    def count_marks(self, node, delta):
+        # Add delta to the marked_below count of every ancestor of node
+        p = self.index.parent[node]
+        while p >= 0:
+            count = self.marked_below.get(p, 0) + delta
+            if count:
+                self.marked_below[p] = count
+            else:
+                self.marked_below.pop(p, None)
+            p = self.index.parent[p]
+
+    def drop_below(self, node):
+        # Counters below a folder only exist because of marks below it, so a
+        # folder without marked descendants costs nothing here
+        below = self.marked_below.pop(node, 0)
+        if not below:
+            return
+        for table in (self.marks, self.sel_count, self.sel_bytes, self.marked_below):
+            for key in [k for k in table if self.is_below(k, node)]:
+                del table[key]
+        self.count_marks(node, -below)
+
+    def set(self, node, checked):
+        # Returns the ancestors whose state may have changed, root first
+        index = self.index
+        chain = []
+        p = index.parent[node]
+        while p >= 0:
+            chain.append(p)
+            p = index.parent[p]
+        chain.reverse()
+
+        marked = []
+        inherited = False
+        for a in chain:
+            inherited = self.marks.get(a, inherited)
+            marked.append(inherited)
+
+        old_count, old_bytes = self.counts(node, self.marks.get(node, inherited))
+        was_marked = node in self.marks
+        self.drop_below(node)
+        self.sel_count.pop(node, None)
+        self.sel_bytes.pop(node, None)
+        if checked == inherited:
+            self.marks.pop(node, None)
+        else:
+            self.marks[node] = checked
+        if was_marked != (node in self.marks):
+            self.count_marks(node, 1 if node in self.marks else -1)
+
+        new_count, new_bytes = (index.leaves[node], index.size[node]) if checked else (0, 0)
+        d_count, d_bytes = new_count - old_count, new_bytes - old_bytes
+        self.total_bytes += d_bytes
+        if d_count or d_bytes:
+            for a, a_marked in zip(reversed(chain), reversed(marked)):
+                count, nbytes = self.counts(a, a_marked)
+                count += d_count
+                nbytes += d_bytes
+                uniform = (index.leaves[a], index.size[a]) if a_marked else (0, 0)
+                if (count, nbytes) == uniform:
+                    self.sel_count.pop(a, None)
+                    self.sel_bytes.pop(a, None)
+                else:
+                    self.sel_count[a] = count
+                    self.sel_bytes[a] = nbytes
+        return chain
+
+    def set_many(self, nodes, checked):
+        # Nodes already covered by an ancestor in the same batch are skipped
+        chosen = set()
+        parent = self.index.parent
+        for node in sorted(nodes):
+            p = parent[node]
+            while p >= 0 and p not in chosen:
+                p = parent[p]
+            if p < 0:
+                chosen.add(node)
+                self.set(node, checked)
+
+    def set_all(self, checked):
+        self.clear()
+        if checked:
+            # Roots still being scanned have no totals yet (leaves stays 0 until
+            # aggregate_sizes); marking them would unbalance the running sums
+            roots = [root for root in self.index.roots if self.index.leaves[root]]
+            self.marks = {root: True for root in roots}
+            self.total_bytes = sum(self.index.size[root] for root in roots)
+
+    def forget(self, root):
+        self.total_bytes -= self.counts(root, self.marks.get(root, False))[1]
+        self.drop_below(root)
+        for table in (self.marks, self.sel_count, self.sel_bytes, self.marked_below):
+            table.pop(root, None)
+
+    def selected_bytes(self):
+        return self.total_bytes
+
+    def resolve(self):
+        # Reduce the selection to the fewest nodes that cover it: fully checked
+        # folders are taken whole, mixed ones are opened up, and everything
+        # else is skipped. Returns (root_id, node_id) pairs in tree order.
+        index = self.index
+        selection = []
+        stack = [(root, root, False) for root in reversed(index.roots)]
+        while stack:
+            root, node, inherited = stack.pop()
+            marked = self.marks.get(node, inherited)
+            if node in self.sel_count:
+                count = self.sel_count[node]
+                if count == index.leaves[node]:
+                    selection.append((root, node))
+                elif count:
+                    stack.extend((root, child, marked) for child in reversed(index.children[node]))
+            elif marked:
+                selection.append((root, node))
+        return selection
+
+    def picked_paths(self):
+        # The resolved selection as full paths, which survive a rescan where node ids don't
+        return [self.index.path(node) for _, node in self.resolve()]
+
+    def select_paths(self, paths):
+        # Re-check what picked_paths() saved; paths that are gone or now excluded are skipped
+        index = self.index
+        by_name = {}
+        nodes = []
+        for path in paths:
+            for root in index.roots:
+                root_path = index.name[root]
+                if path == root_path:
+                    nodes.append(root)
+                    break
+                if not path.startswith(os.path.join(root_path, "")):
+                    continue
+                node = root
+                for part in os.path.relpath(path, root_path).split(os.sep):
+                    names = by_name.get(node)
+                    if names is None:
+                        names = by_name[node] = {index.name[c]: c for c in index.children.get(node, ())}
+                    node = names.get(part)
+                    if node is None:
+                        break
+                if node is not None:
+                    nodes.append(node)
+                break
+        self.set_many(nodes, True)
+
+
+def relative_parts(index, root, node):
+    parts = []
+    while node != root:
+        parts.append(index.name[node])
+        node = index.parent[node]
+    parts.reverse()
+    return parts
+
+
+def iter_archive_entries(index, roots, matcher=None):
+    # (full_path, arcname, size) for every file under the given roots, in tree
+    # order, taken from the already pruned index instead of a second disk walk
+    for root in roots:
+        root_path = index.name[root]
+        excluded = matcher.for_root(root_path) if matcher is not None else None
+        stack = [(root, root_path, os.path.basename(root_path))]
+        while stack:
+            node, path, arcname = stack.pop()
+            if excluded is not None and excluded(path, index.is_dir[node]):
+                continue
+            if not index.is_dir[node]:
+                yield path, arcname, index.size[node]
+                continue
+            for child in reversed(index.children[node]):
+                name = index.name[child]
+                stack.append((child, os.path.join(path, name), os.path.join(arcname, name)))
+
+
+def copy_plan(index, selection, dest_root, matcher=None):
+    # Expand a resolved selection into destination folders and
+    # (src_path, dst_path, size, label) file jobs, straight from the index.
+    # Paths are built by joining down the tree rather than by relpath/normcase
+    # per node, and folders the ExcludeMatcher rejects are pruned unexpanded.
+    dirs = []
+    jobs = []
+    for root, node in selection:
+        root_path = index.name[root]
+        rel_parts = relative_parts(index, root, node)
+        label = os.path.join(os.path.basename(root_path), *rel_parts)
+        src_path = os.path.join(root_path, *rel_parts)
+        excluded = matcher.for_root(root_path) if matcher is not None else None
+
+        stack = [(node, src_path, os.path.join(dest_root, label), label)]
+        while stack:
+            node, src_path, dst_path, label = stack.pop()
+            if excluded is not None and excluded(src_path, index.is_dir[node]):
+                continue
+            if not index.is_dir[node]:
+                jobs.append((src_path, dst_path, index.size[node], label))
+                continue
+            dirs.append(dst_path)
+            for child in index.children[node]:
+                name = index.name[child]
+                stack.append((child, os.path.join(src_path, name), os.path.join(dst_path, name),
+                              os.path.join(label, name)))
+    return dirs, jobs
@@ -0,0 +1,258 @@
+# smart_copier.py
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+
+from scanner import ScanIndex, scan_parallel, SCAN_WORKERS
+from selection import SelectionModel, copy_plan, iter_archive_entries
+from exclude_matcher import ExcludeMatcher
+from project_mapper import PROJECT_EXCLUDES, DEFAULT_EXCLUDES, detect_project_types, project_excludes, merge_excludes
+from copy_engine import CopyEngine, COPY_WORKERS
+from copy_journal import CopyJournal
+from copy_logger import CopyLogger
+from scan_cache import user_cache_dir
+from archive_backends import ARCHIVE_BACKENDS, ZIP_LEVEL, available_formats, archive_name, make_backend, stream_entries
+from progress import ProgressTracker
+
+# Headless front end to the same scan, copy and archive engines the GUI uses:
+#   python -m smart_copier SRC [SRC ...] --dest DIR [--mode copy|sync|zip] ...
+# Progress goes to stdout as one JSON object per line; engine chatter goes to stderr.
+
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1  # finished, but some files could not be copied or archived
+EXIT_USAGE = 2  # bad arguments or missing source folder (argparse uses 2 as well)
+EXIT_FAILED = 3  # the run itself failed, e.g. the archive could not be written
+EXIT_INTERRUPTED = 130
+
+PROGRESS_INTERVAL = 0.5  # seconds between progress lines
+
+PROGRESS_FIELDS = ("done_items", "total_items", "done_bytes", "total_bytes", "errors",
+                   "percent", "speed", "eta", "elapsed", "current")
+
+
+class JsonLines:
+    # Events can come from worker threads, so whole lines are written under a lock
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        line = json.dumps(dict(event=event, **fields), default=str)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="smart_copier",
+                                     description="Copy, sync or archive project folders without the GUI.")
+    parser.add_argument("sources", nargs="+", help="source folders")
+    parser.add_argument("--dest", required=True, help="destination folder")
+    parser.add_argument("--mode", choices=("copy", "sync", "zip"), default="copy",
+                        help="copy everything, sync only changed files, or build an archive (default: copy)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="gitignore-style exclude pattern, repeatable; added to the defaults")
+    parser.add_argument("--no-default-excludes", action="store_true",
+                        help=f"don't exclude {', '.join(DEFAULT_EXCLUDES)} by default")
+    parser.add_argument("--project-type", action="append", default=[], choices=sorted(PROJECT_EXCLUDES),
+                        help="also apply that project type's excludes, repeatable")
+    parser.add_argument("--detect", action="store_true",
+                        help="detect project types from the source folders, as the GUI does on drop")
+    parser.add_argument("--workers", type=int, default=COPY_WORKERS, help="copy / compression threads")
+    parser.add_argument("--scan-workers", type=int, default=SCAN_WORKERS, help="folder listing threads")
+    parser.add_argument("--no-cache", action="store_true", help="rescan every folder instead of using the scan cache")
+    parser.add_argument("--cache-dir", default=user_cache_dir(), help="where the scan cache is kept")
+    parser.add_argument("--log-dir", help="copy: where copy_log.json/.txt are written (default: --dest)")
+    parser.add_argument("--verify-hash", action="store_true", help="sync: compare contents, not just size and mtime")
+    parser.add_argument("--resume", action="store_true", help="resume an interrupted copy into --dest")
+    parser.add_argument("--format", choices=list(ARCHIVE_BACKENDS), default="zip", help="zip: archive format")
+    parser.add_argument("--level", type=int, default=ZIP_LEVEL, choices=range(0, 23), metavar="0-22",
+                        help="zip: compression level (zip, tar.gz, tar.xz 0-9; tar.zst 1-22)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="zip: reuse unchanged members of an existing archive")
+    parser.add_argument("--name", help="zip: archive file name (default: named after the sources)")
+    parser.add_argument("--interval", type=float, default=PROGRESS_INTERVAL, help="seconds between progress lines")
+    return parser
+
+
+def resolve_excludes(args, sources):
+    project_types = set(args.project_type)
+    if args.detect:
+        project_types |= detect_project_types(sources)
+    patterns = ([] if args.no_default_excludes else list(DEFAULT_EXCLUDES)) + args.exclude
+    return sorted(project_types), merge_excludes(patterns, project_excludes(project_types))
+
+
+def run_with_progress(work, tracker, out, interval, cancel=None):
+    # Runs work() on a thread and reports the tracker from this one, so the
+    # number of progress lines depends on elapsed time, not on file count.
+    # On Ctrl-C, cancel() is called and the worker is given time to clean up.
+    outcome = {}
+
+    def worker():
+        try:
+            outcome["result"] = work()
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            tracker.finish()
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(interval)
+            emit_progress(out, tracker.snapshot())
+    except KeyboardInterrupt:
+        if cancel is not None:
+            cancel()
+            thread.join()
+        raise
+    return outcome
+
+
+def emit_progress(out, snap):
+    for line in snap["log_lines"]:
+        out.emit("log", line=line)
+    out.emit("progress", **{field: snap[field] for field in PROGRESS_FIELDS})
+
+
+def copy_sources(args, index, matcher, tracker, out):
+    dest_root = os.path.abspath(args.dest)
+    os.makedirs(dest_root, exist_ok=True)
+    logger = CopyLogger(os.path.abspath(args.log_dir) if args.log_dir else dest_root)
+    engine = CopyEngine(args.workers, sync=args.mode == "sync", verify_hash=args.verify_hash,
+                        journal=CopyJournal(dest_root), resume=args.resume)
+
+    selection = SelectionModel(index)
+    selection.set_all(True)
+    dirs, jobs = copy_plan(index, selection.resolve(), dest_root, matcher)
+    tracker.set_totals(len(jobs), sum(job[2] for job in jobs))
+    out.emit("start", mode=args.mode, dest=dest_root, files=len(jobs), bytes=tracker.total_bytes)
+
+    # Only failures are logged line by line; the rest is in the progress counts
+    def on_file_done(job, error, skipped):
+        src_path, dst_path, size, label = job
+        if error is not None:
+            print(f"Error copying {src_path}: {error}")
+            logger.log_error(label, str(error))
+            tracker.item_done(label, error=error, log_line=f"[ERROR] {src_path} -> {error}")
+        elif skipped:
+            logger.log_skipped(label)
+            tracker.item_done(label)
+        else:
+            logger.log_success(label)
+            tracker.item_done(label)
+
+    def work():
+        try:
+            engine.run(jobs, dirs, on_file_done, tracker.add_bytes)
+        finally:
+            # The files are copied either way; a log that can't be written is only a warning
+            try:
+                logger.save()
+            except OSError as e:
+                out.emit("warning", message=f"Could not save the copy log: {e}")
+        return {"dest": dest_root, "method": engine.strategy_summary()}
+
+    return work, engine.cancel
+
+
+def zip_sources(args, index, tracker, out):
+    roots = list(index.roots)
+    top_level_folders = [(os.path.basename(index.name[node]), index.name[node]) for node in roots]
+    backend = make_backend(args.format, args.level, args.workers, incremental=args.incremental)
+    zip_name = args.name or archive_name(top_level_folders, backend.extension)
+    zip_path = os.path.join(os.path.abspath(args.dest), zip_name)
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+
+    # Same as the GUI: archive straight from the pruned index with known totals
+    estimate = (sum(1 for root in roots for node in index.iter_subtree(root) if not index.is_dir[node]),
+                sum(index.size[root] for root in roots))
+    out.emit("start", mode="zip", archive=zip_path, format=args.format, files=estimate[0], bytes=estimate[1])
+
+    def work():
+        report = backend.write(zip_path, stream_entries(iter_archive_entries(index, roots), tracker, estimate),
+                               tracker)
+        return {"archive": zip_path, "report": report}
+
+    return work, None
+
+
+def run(args, out):
+    sources = [os.path.abspath(path) for path in args.sources]
+    missing = [path for path in sources if not os.path.isdir(path)]
+    if missing:
+        out.emit("error", message="Source folder not found", paths=missing)
+        return EXIT_USAGE
+    if args.format not in available_formats():
+        out.emit("error", message=f"Archive format {args.format} is not available here")
+        return EXIT_USAGE
+    levels = ARCHIVE_BACKENDS[args.format].levels
+    if args.mode == "zip" and args.level not in levels:
+        out.emit("error", message=f"{args.format} compression level must be {levels[0]}-{levels[-1]}")
+        return EXIT_USAGE
+    if args.resume and not CopyJournal(os.path.abspath(args.dest)).exists():
+        out.emit("error", message="No interrupted copy was found in the destination folder")
+        return EXIT_USAGE
+
+    project_types, excludes = resolve_excludes(args, sources)
+    matcher = ExcludeMatcher(excludes)
+    out.emit("config", sources=sources, dest=os.path.abspath(args.dest), mode=args.mode,
+             project_types=project_types, excludes=excludes)
+
+    # Scan with the GUI's parallel scanner and cache, reporting at most once per interval
+    index = ScanIndex()
+    started = time.perf_counter()
+    last = [started]
+
+    def on_batch(count):
+        now = time.perf_counter()
+        if now - last[0] >= args.interval:
+            last[0] = now
+            out.emit("scan", items=count)
+
+    cancel_scan = threading.Event()
+    try:
+        scan_parallel(index, sources, excludes, args.scan_workers, not args.no_cache, cancel_scan, on_batch,
+                      args.cache_dir)
+    except KeyboardInterrupt:
+        cancel_scan.set()  # stops the scan pool and keeps the previous scan cache
+        raise
+    out.emit("scanned", items=len(index), bytes=sum(index.size[root] for root in index.roots),
+             seconds=round(time.perf_counter() - started, 3))
+
+    tracker = ProgressTracker()
+    if args.mode == "zip":
+        work, cancel = zip_sources(args, index, tracker, out)
+    else:
+        work, cancel = copy_sources(args, index, matcher, tracker, out)
+    outcome = run_with_progress(work, tracker, out, args.interval, cancel)
+
+    snap = tracker.snapshot()
+    if "error" in outcome:
+        out.emit("failed", message=str(outcome["error"]), errors=snap["errors"])
+        return EXIT_FAILED
+    out.emit("done", files=snap["done_items"], bytes=snap["done_bytes"], errors=snap["errors"],
+             seconds=round(snap["elapsed"], 3), **outcome["result"])
+    return EXIT_FILE_ERRORS if snap["errors"] else EXIT_OK
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    out = JsonLines(sys.stdout)
+    # The engines print diagnostics; keep them out of the JSON stream
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            return run(args, out)
+        except KeyboardInterrupt:
+            out.emit("interrupted")
+            return EXIT_INTERRUPTED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
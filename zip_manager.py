@@ -1,18 +1,29 @@
 import os
-import zipfile
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+from archive_backends import make_backend, iter_zip_entries, stream_entries
+from progress import ProgressTracker, poll_progress, format_eta
+
 class ZipManager:
     def __init__(self, app):
         self.app = app
 
-    def zip_selected(self, top_level_folders, dest, zip_filename="smart-project.zip"):
+    def zip_selected(self, top_level_folders, dest, zip_filename="smart-project.zip", estimate=None, entries=None):
         print("Zipping selected folders...",
               f"Top-level folders: {top_level_folders}, Destination: {dest}")
         zip_path = os.path.join(dest, zip_filename)
         os.makedirs(dest, exist_ok=True)
+        # "Only changed files" makes a zip reuse the unchanged members of the previous archive
+        try:
+            backend = make_backend(self.app.archive_format.get(), self.app.zip_level.get(), self.app.copy_workers.get(),
+                                   incremental=self.app.sync_mode.get())
+        except (ValueError, tk.TclError) as e:
+            # TclError: the spinbox text isn't a number
+            messagebox.showerror("Invalid Level", str(e))
+            self.app.start_btn.config(state="normal")
+            return
 
         if not top_level_folders:
             messagebox.showwarning("Nothing to Zip", "Please select at least one top-level folder.")
@@ -47,42 +58,45 @@ class ZipManager:
         file_label = ttk.Label(popup, text="Starting...")
         file_label.pack(pady=5)
 
+        speed_label = ttk.Label(popup, text="")
+        speed_label.pack()
+
+        tracker = ProgressTracker()
+        outcome = {}
+
+        def render(snap):
+            progress.config(maximum=100, value=snap["percent"])
+            percent_label.config(text=f"{int(snap['percent'])}%")
+            if snap["current"]:
+                file_label.config(text=f"Adding: {snap['current']}")
+            speed_label.config(text=f"{snap['speed'] / (1024 * 1024):.2f} MB/s   ETA: {format_eta(snap['eta'])}")
+
+        def on_finish(snap):
+            if "error" in outcome:
+                file_label.config(text=f"❌ Error: {outcome['error']}")
+                messagebox.showerror("Zip Failed", str(outcome["error"]))
+            else:
+                file_label.config(text="✅ Zipping complete!")
+                messagebox.showinfo("Done", f"Archive created:\n{zip_path}\n\n{outcome['report']}")
+            self.app.start_btn.config(state="normal")
+            self.app.after(1500, popup.destroy)
+
         def zip_worker():
             try:
-                # Step 1: Count all files first
-                all_files = []
-                for folder_name, folder_path in top_level_folders:
-                    for dirpath, dirnames, filenames in os.walk(folder_path):
-                        dirnames[:] = [d for d in dirnames if d != "node_modules"]
-                        for f in filenames:
-                            full_path = os.path.join(dirpath, f)
-                            rel_path = os.path.relpath(full_path, folder_path)
-                            arcname = os.path.join(folder_name, rel_path)
-                            all_files.append((full_path, arcname))
-
-                total_files = len(all_files)
-                self.app.after(0, lambda: progress.config(maximum=total_files))
-
-                # Step 2: Start actual zipping
-                with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-                    for i, (full_path, arcname) in enumerate(all_files, 1):
-                        self.app.after(0, lambda path=arcname: file_label.config(text=f"Adding: {path}"))
-                        try:
-                            zipf.write(full_path, arcname)
-                        except Exception as e:
-                            print(f"Skipping {full_path} due to {e}")
-
-                        self.app.after(0, lambda val=i: progress.config(value=val))
-                        percent = int((i / total_files) * 100)
-                        self.app.after(0, lambda p=percent: percent_label.config(text=f"{p}%"))
-
-                self.app.after(0, lambda: file_label.config(text="✅ Zipping complete!"))
-                self.app.after(0, lambda: messagebox.showinfo("Done", f"Zip created:\n{zip_path}"))
+                # Step 1: Walk on a separate thread, feeding files in as they are found
+                if entries is None:
+                    files = iter_zip_entries(top_level_folders, self.app.get_all_excludes())
+                else:
+                    files = entries
+                all_files = stream_entries(files, tracker, estimate)
+
+                # Step 2: Compress and write them with the chosen archive format
+                outcome["report"] = backend.write(zip_path, all_files, tracker)
             except Exception as e:
-                self.app.after(0, lambda: file_label.config(text=f"❌ Error: {e}"))
-                self.app.after(0, lambda: messagebox.showerror("Zip Failed", str(e)))
+                outcome["error"] = e
             finally:
-                self.app.after(0, lambda: self.app.start_btn.config(state="normal"))
-                self.app.after(1500, popup.destroy)
+                tracker.finish()
 
+        # Progress is drawn by a 10 Hz poll, not by per-file callbacks from the worker
+        poll_progress(self.app, tracker, render, on_finish)
         threading.Thread(target=zip_worker, daemon=True).start()